@@ -1,9 +1,11 @@
 import os
+import io
 import time
 import random
 # import git
 from redis import Redis
 import tempfile
+import urllib.parse
 import pickle
 import zlib
 import numpy as np
@@ -19,9 +21,14 @@ from project.machine_learning.src.model_trainer import model_trainer
 from project.machine_learning.src import util
 from project.machine_learning.src.csv_file_modifier.modifier import csv_modifier
 from project.machine_learning.src.preprocessor import preprocess as pre
+from project.machine_learning.src.parallel_preprocessor import parallel_preprocessor, get_available_cores, get_workers_per_task
 from project.machine_learning.src.duplicate_remover import comment_database as cdb
 from werkzeug.utils import secure_filename
 from project.machine_learning.src import extractor
+from project.machine_learning.src.comment_cache import comment_cache
+from project.machine_learning.src.source_filter import source_filter
+from project.machine_learning.src.clone_pool import clone_pool
+from project.machine_learning.src import pipeline
 matplotlib.use('Agg')
 
 model = model_trainer()
@@ -32,8 +39,51 @@ model.open_binarizer('binarizer.pkl')
 # r = Redis("machine_learning_app_redis_1", 6379)
 r = Redis.from_url(os.environ['REDIS_URL'])
 
+
+def with_database(url, db) -> str:
+  """Get a Redis URL selecting another database of the same server"""
+  return urllib.parse.urlparse(url)._replace(path='/' + str(db)).geturl()
+
+
+# Uploaded archives, in a database of their own since every CSV upload flushes the one of r
+archive_store = Redis.from_url(os.environ.get('ARCHIVE_REDIS_URL', with_database(os.environ['REDIS_URL'], 1)))
+
+# Seconds an uploaded archive is kept for its job, dropped earlier once read
+archive_ttl = int(os.environ.get('ARCHIVE_TTL', 24 * 3600))
+
+# Comments extracted from repositories, keyed by git blob, kept across jobs
+comment_cache_file = os.environ.get('COMMENT_CACHE', os.path.join(tempfile.gettempdir(), 'comment_cache.db'))
+
+# Preprocessed comments, keyed by the hash of their text and of the preprocessing, kept across jobs
+preprocess_cache_file = os.environ.get('PREPROCESS_CACHE', os.path.join(tempfile.gettempdir(), 'preprocess_cache.db'))
+
+# Clones of repositories, fetched into instead of cloned again by later jobs
+clones = clone_pool(os.environ.get('CLONE_POOL', os.path.join(tempfile.gettempdir(), 'clone_pool')),
+                    max_bytes=int(os.environ.get('CLONE_POOL_MAX_BYTES', 2 * 1024 ** 3)))
+
+# Comments are labeled in batches, a few batches waiting between two labeling stages at most
+label_batch_size = int(os.environ.get('LABEL_BATCH_SIZE', 2000))
+label_queued_batches = int(os.environ.get('LABEL_QUEUED_BATCHES', 4))
+labeling_pipelined = os.environ.get('LABELING_PIPELINED', '1') != '0'
+
+# Misspelled words of comments are corrected to the nearest dictionary word before they are split
+spelling_correction = os.environ.get('SPELLING_CORRECTION', '0') != '0'
+
+# Tokeniser of the preprocessing, nltk or regex, see preprocessor.TOKENISERS
+tokeniser = os.environ.get('TOKENISER', 'nltk')
+
+# Tasks the Celery worker runs at once, one per core by default like Celery itself
+worker_concurrency = int(os.environ.get('CELERY_CONCURRENCY', get_available_cores()))
+
+# Comments of a job are preprocessed by this many processes, in the task process when 1. Every
+# task of the worker starts its own, so by default the cores are shared between the worker_concurrency tasks
+preprocessing_workers = int(os.environ.get('PREPROCESSING_WORKERS', get_workers_per_task(worker_concurrency)))
+
+# Directory path jobs may label the files under, path jobs are refused when it is not set
+ingest_root = os.environ.get('INGEST_ROOT')
+
 def process(comment):
-  process = pre(dictionary_file='word.pkl')
+  process = pre(dictionary_file='word.pkl', spelling_correction=spelling_correction, tokeniser=tokeniser)
   return process.process_comment(comment)
 
 
@@ -82,9 +132,14 @@ def background_file_labeler(file, column: str):
 
   print("processing file: " + filename, 'in column', column)
 
-  process = pre(file, column, dictionary_file='word.pkl')
-
-  data['new_line'] = data[column].apply(lambda x: process.process_comment(x)[0])
+  cache = comment_cache(preprocess_cache_file, tablename='preprocessed_comments')
+  try:
+    with parallel_preprocessor('word.pkl', preprocessing_workers, cache=cache,
+                               spelling_correction=spelling_correction, tokeniser=tokeniser) as process:
+      data['new_line'] = process.process_series(data[column])
+  finally:
+    print("preprocessing cache hit rate:", cache.hit_rate())
+    cache.close()
 
   print("predicting", filename)
 
@@ -167,28 +222,114 @@ def to_only_none(input):
 def repo(repo_url, branch):
     print("attempting to get from repo")
     repo = repo_url
+    cache = comment_cache(comment_cache_file)
+    file_filter = source_filter()
+    try:
+      comments = extractor.iter_comment_from_repo(repo, branch, cache=cache, file_filter=file_filter,
+                                                  bare=True, blob_limit=file_filter.max_file_size, pool=clones)
+      return label_comments(comments)
+    finally:
+      print("comment cache hit rate:", cache.hit_rate())
+      print("files skipped:", file_filter.summary())
+      cache.close()
+
+
+def archive(data_key, filename):
+    print("attempting to get from archive", filename)
+    data = archive_store.get(data_key)
+    if data is None:
+      raise KeyError("archive " + filename + " is not stored under " + data_key + ", it expired or was already labeled")
+    archive_store.delete(data_key)
+    content = zlib.decompress(data)
+    file_filter = source_filter()
+    comments = extractor.iter_comment_from_archive(io.BytesIO(content), filename, file_filter=file_filter)
+    try:
+      return label_comments(comments)
+    finally:
+      print("files skipped:", file_filter.summary())
+
+
+def resolve_ingest_path(path) -> str:
+  """Get the real path of a directory of a path job, None if it is outside of ingest_root or ingest_root is not set"""
+  if not ingest_root or not path:
+    return None
+  root = os.path.realpath(ingest_root)
+  # Links are followed, so neither .. nor a link leads out of the root
+  res = os.path.realpath(os.path.join(root, path))
+  if os.path.commonpath([root, res]) != root:
+    return None
+  return res
+
+
+def local(path):
+    print("attempting to get from path", path)
+    resolved = resolve_ingest_path(path)
+    if resolved is None:
+      raise ValueError("path jobs are restricted to directories under INGEST_ROOT, refusing " + str(path))
+    path = resolved
+    file_filter = source_filter()
+    comments = extractor.iter_comment_from_local(path, file_filter=file_filter)
+    try:
+      return label_comments(comments)
+    finally:
+      print("files skipped:", file_filter.summary())
+
+
+def iter_unique_comments(comments_per_file):
+  """Yields the comments drop_duplicates on language and line, then on language and location, would keep"""
+  seen_lines = set()
+  seen_locations = set()
+  for comment in chain.from_iterable(comments_per_file):
+    line = (comment['language'], comment['line'])
+    if line in seen_lines:
+      continue
+    seen_lines.add(line)
+
+    location = (comment['language'], comment['location'])
+    if location in seen_locations:
+      continue
+    seen_locations.add(location)
+
+    yield comment
+
+
+def label_comments(comments_per_file, pipelined=labeling_pipelined):
+    """Label the comments of every file, store them and count their labels
+
+    The comments are labeled in batches going through extraction,
+    preprocessing and prediction stages. When pipelined the stages overlap,
+    prediction starting on the first batch while files are still extracted.
+    """
     column = 'line'
-    with tempfile.TemporaryDirectory() as tmpdirname:
-      files = extractor.get_comment_from_repo_using_all_languages(repo , branch, tmpdirname)
-      data = pd.DataFrame()
-      for file in files:
-        print(file)
-        new_data = pd.read_csv(file)
-        new_data = new_data.drop_duplicates(subset=['line'])
-        new_data = new_data.drop_duplicates(subset=['location'])
-        data = pd.concat([new_data, data])
-        print("processing file: " + file)
-
-    processor = pre(file, column, dictionary_file='word.pkl')
-
-    print('preprocessing...')
-    data['new_line'] = data[column].apply(lambda x: processor.process_comment(x)[0])
-
-    print("predicting...")
-    prediction, binarizer = model.predict(data[['new_line', 'language']])
-    prediction = binarizer.inverse_transform(prediction)
-
-    data['prediction'] = prediction
+    cache = comment_cache(preprocess_cache_file, tablename='preprocessed_comments')
+    processor = parallel_preprocessor('word.pkl', preprocessing_workers, cache=cache,
+                                      spelling_correction=spelling_correction, tokeniser=tokeniser)
+
+    def preprocess_batch(batch):
+      data = pd.DataFrame.from_records(batch, columns=['line', 'location', 'language'])
+      print('preprocessing', len(data), 'comments...')
+      data['new_line'] = processor.process_series(data[column])
+      return data
+
+    def predict_batch(data):
+      print("predicting", len(data), "comments...")
+      prediction, binarizer = model.predict(data[['new_line', 'language']])
+      data['prediction'] = binarizer.inverse_transform(prediction)
+      return data
+
+    batches = pipeline.iter_batches(iter_unique_comments(comments_per_file), label_batch_size)
+    # The workers are started before the pipeline threads, not forked while they run
+    try:
+      with processor:
+        frames = list(pipeline.iter_pipeline(batches, [preprocess_batch, predict_batch], label_queued_batches, pipelined))
+    finally:
+      print("preprocessing cache hit rate:", cache.hit_rate())
+      cache.close()
+    if frames:
+      data = pd.concat(frames, ignore_index=True)
+    else:
+      data = pd.DataFrame(columns=['line', 'location', 'language', 'new_line', 'prediction'])
+
     dataname = random_string()
 
     store_df(data, dataname)
@@ -1,7 +1,10 @@
 import sys
+import json
+import pandas as pd
 from project.machine_learning.src.model_trainer import model_trainer
 from project.machine_learning.src.preprocessor import preprocess as pre
-from project.machine_learning src.import extractor as app
+from project.machine_learning.src.preprocessor import write_frequency_dictionary
+from project.machine_learning.src import extractor as app
 from project.machine_learning.src.duplicate_remover import comment_database as cdb
 from project.machine_learning.src.keyword_filter import keyword_filter
 from project.machine_learning.src.csv_file_modifier.modifier import csv_modifier as cm
@@ -21,6 +24,10 @@ if length == 2 and sys.argv[1] in ('-h', '--help'):
   print('usage: \n run.py <command> <filename or repository')
   print('To get comments from directory: \n python3 run.py -d <root directory>')
   print('To get comments from repositories: \n python3 run.py -repo <repository link> <branch name> <depth>')
+  print('To get comments from a tar or zip archive: \n python3 run.py -archive <archive file>')
+  print('To get the comments every commit adds and removes: \n python3 run.py -history <repository link> <branch name> [<revision range>]')
+  print('To count the words of the processed comments of files: \n python3 run.py -dist <column> <csv files>')
+  print('To compare the nltk and regex tokenisers on comments: \n python3 run.py -tokenisers <column> <csv file> [<sample size>]')
 
 elif length >= 3:
     command1 = sys.argv[1]
@@ -34,6 +41,14 @@ elif length >= 3:
         repo = sys.argv[2]
         branch = sys.argv[3]
         app.get_comment_from_repo_using_all_languages(repo , branch, './')
+    elif command1 == '-archive':
+      app.write_comment_shards(app.iter_comment_from_archive(directory), './', app.languages.values())
+    elif command1 == '-history':
+      if length < 4:
+        Exception("Not enough arguments")
+      else:
+        revisions = sys.argv[4] if length > 4 else None
+        app.get_comment_history_from_repo(sys.argv[2], sys.argv[3], './', revisions)
     elif command1 == "-process":
       leng = len(sys.argv)
       thing = sys.argv[2]
@@ -42,6 +57,21 @@ elif length >= 3:
         process.open_csv_file(sys.argv[i])
         process.set_field_to_process(thing)
         process.create_new_processed_file()
+    elif command1 == "-dist":
+      process.set_field_to_process(sys.argv[2])
+      counts = None
+      for i in range(3, len(sys.argv)):
+        print("counting words of file: " + sys.argv[i])
+        counts = process.count_words(sys.argv[i], counts)
+      if counts:
+        filename = cm().find_next_filename("word_frequency_dictionary", './', "json")
+        write_frequency_dictionary(counts, filename)
+        print("word frequencies written to", filename)
+    elif command1 == "-tokenisers":
+      comments = pd.read_csv(sys.argv[3], usecols=[sys.argv[2]], dtype=str, keep_default_na=False)[sys.argv[2]]
+      if length > 4:
+        comments = comments.sample(min(int(sys.argv[4]), len(comments)), random_state=0)
+      print(json.dumps(process.compare_tokenisers(list(comments)), indent=2, ensure_ascii=False))
     elif command1 == "-duplicate":
       leng = len(sys.argv)
       duplicated_files = []
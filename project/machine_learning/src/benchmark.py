@@ -0,0 +1,213 @@
+import os
+import sys
+import git
+import json
+import contextlib
+import time
+import random
+import platform
+import resource
+import tempfile
+from typing import TypeVar, List
+from project.machine_learning.src import extractor
+
+T = TypeVar("T")
+
+###############################################################################
+#         Benchmark of the extractor over a synthetic, deterministic corpus   #
+###############################################################################
+
+WORDS = ['the', 'value', 'returns', 'buffer', 'list', 'index', 'check', 'if', 'user', 'file', 'todo', 'fix',
+         'this', 'when', 'error', 'cache', 'size', 'read', 'write', 'parse', 'token', 'node', 'empty', 'loop']
+
+CODE_LINES = ['x = y + 1;', 'call(value, index);', 'if (a > b) { return a; }', 'for item in items:',
+              'result.append(node)', 'buffer[i] = token', 'print("# not a comment")', 'end']
+
+FILE_LINES = (20, 200, 2000)
+COMMENT_DENSITIES = (0.05, 0.25, 0.6)
+
+
+def get_comment_markers(language: dict) -> (str, str, str):
+    """Get the single line marker and the multiline start and end of a language, None when it has none"""
+    single_line = [marker.replace('\\', '') for marker in language['single_line'] if marker != '▓']
+    single_line = single_line[0] if single_line else None
+    if language['multiline_start'] == '▓':
+        return single_line, None, None
+
+    return single_line, language['multiline_start'].replace('\\', ''), language['multiline_end'].replace('\\', '')
+
+
+def generate_source(language: dict, lines: int, density: float, rand: random.Random) -> str:
+    """Generate the source of a file of a language with a share of density comment lines
+
+    Keyword Arguments:
+    language -- the language the file is written in
+    lines -- the number of lines of the file
+    density -- the share of the lines that are comments
+    rand -- the random generator, seeded for the corpus to be deterministic
+    """
+    single_line, multiline_start, multiline_end = get_comment_markers(language)
+    res = []
+    while len(res) < lines:
+        if rand.random() >= density:
+            res.append(rand.choice(CODE_LINES))
+            continue
+
+        comment = ' '.join(rand.choice(WORDS) for i in range(rand.randint(2, 12)))
+        if multiline_start is not None and (single_line is None or rand.random() < 0.3):
+            res.append(multiline_start + ' ' + comment)
+            res.extend(' '.join(rand.choice(WORDS) for i in range(6)) for j in range(rand.randint(0, 3)))
+            res.append(multiline_end)
+        elif rand.random() < 0.5:
+            res.append(single_line + ' ' + comment)
+        else:
+            res.append(rand.choice(CODE_LINES) + ' ' + single_line + ' ' + comment)
+
+    return '\n'.join(res[:lines]) + '\n'
+
+
+def generate_corpus(directory: str, files_per_size: int=4, file_lines: List[int]=FILE_LINES,
+                    densities: List[float]=COMMENT_DENSITIES, seed: int=0) -> dict:
+    """Write a synthetic source tree of every language, returns the files written per language
+
+    The same arguments always generate the same tree.
+
+    Keyword Arguments:
+    directory -- the root of the tree
+    files_per_size -- the number of files of every size and density of a language
+    file_lines -- the number of lines of the files
+    densities -- the share of the lines of the files that are comments
+    seed -- the seed of the random generator
+    """
+    rand = random.Random(seed)
+    res = {}
+    for key in sorted(extractor.languages):
+        language = extractor.languages[key]
+        language_directory = os.path.join(directory, language['format'])
+        os.makedirs(language_directory, exist_ok=True)
+        res[key] = []
+        for lines in file_lines:
+            for density in densities:
+                for i in range(files_per_size):
+                    filename = os.path.join(language_directory, '%d_%d_%d.%s' % (lines, density * 100, i, language['format']))
+                    with open(filename, 'w', encoding='utf-8', newline='\n') as f:
+                        f.write(generate_source(language, lines, density, rand))
+                    res[key].append(filename)
+
+    return res
+
+
+def get_process_peak_rss() -> int:
+    """Get the peak resident set size of the whole process so far, in bytes
+
+    It never goes down, so it is reported once for the run and not per language.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def time_run(run, repeat: int) -> float:
+    """Get the fastest of repeat runs of a function, in seconds"""
+    res = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        res = elapsed if res is None else min(res, elapsed)
+
+    return res
+
+
+def get_rates(files: List[str], seconds: float) -> dict:
+    size = sum(os.path.getsize(file) for file in files)
+    return {'files': len(files), 'bytes': size, 'seconds': seconds,
+            'files_per_second': len(files) / seconds if seconds > 0 else None,
+            'mb_per_second': size / (1024 * 1024) / seconds if seconds > 0 else None}
+
+
+def benchmark_extract_all_comment_from_file(files: List[str], language: dict, repeat: int=3) -> dict:
+    """Time extract_all_comment_from_file over the files of a language"""
+    def run():
+        for file in files:
+            extractor.extract_all_comment_from_file(file, language)
+
+    return get_rates(files, time_run(run, repeat))
+
+
+def benchmark_extract_comment_from_path(directory: str, files: List[str], language: dict, repeat: int=3) -> dict:
+    """Time extract_comment_from_path over a tree for a language, comment files included"""
+    def run():
+        with tempfile.TemporaryDirectory() as output_dir:
+            extractor.extract_comment_from_path(directory, language, output_dir)
+
+    return get_rates(files, time_run(run, repeat))
+
+
+def get_revision() -> str:
+    try:
+        with git.Repo(os.path.dirname(os.path.abspath(__file__)), search_parent_directories=True) as git_repo:
+            return git_repo.head.commit.hexsha
+    except (git.exc.InvalidGitRepositoryError, git.exc.GitCommandError, ValueError):
+        return None
+
+
+def run_benchmark(directory: str=None, repeat: int=3, files_per_size: int=4, file_lines: List[int]=FILE_LINES,
+                  densities: List[float]=COMMENT_DENSITIES, seed: int=0) -> dict:
+    """Benchmark the extractor per language, returns the report
+
+    Keyword Arguments:
+    directory -- where the corpus is generated, a temporary directory if not given
+    repeat -- the number of runs the fastest one is reported of
+    files_per_size -- the number of files of every size and density of a language
+    file_lines -- the number of lines of the files
+    densities -- the share of the lines of the files that are comments
+    seed -- the seed of the corpus
+    """
+    if directory is None:
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            return run_benchmark(tmpdirname, repeat, files_per_size, file_lines, densities, seed)
+
+    corpus = generate_corpus(directory, files_per_size, file_lines, densities, seed)
+    results = {}
+    for key, files in corpus.items():
+        language = extractor.languages[key]
+        language_directory = os.path.join(directory, language['format'])
+        results[key] = {
+            'extract_all_comment_from_file': benchmark_extract_all_comment_from_file(files, language, repeat),
+            'extract_comment_from_path': benchmark_extract_comment_from_path(language_directory, files, language, repeat),
+        }
+
+    return {'revision': get_revision(), 'python': platform.python_version(), 'time': time.time(),
+            'extractor_version': extractor.EXTRACTOR_VERSION,
+            'corpus': {'files_per_size': files_per_size, 'file_lines': list(file_lines),
+                       'densities': list(densities), 'seed': seed},
+            'repeat': repeat, 'process_peak_rss': get_process_peak_rss(), 'results': results}
+
+
+def compare_benchmarks(old: dict, new: dict) -> dict:
+    """Get the speedup in files per second of every benchmark of a new report over an old one"""
+    res = {}
+    for key, benchmarks in new['results'].items():
+        for name, rates in benchmarks.items():
+            old_rates = old['results'].get(key, {}).get(name)
+            if old_rates and old_rates['files_per_second'] and rates['files_per_second']:
+                res.setdefault(key, {})[name] = rates['files_per_second'] / old_rates['files_per_second']
+
+    return res
+
+
+if __name__ == '__main__':
+    # usage: python3 -m project.machine_learning.src.benchmark [report.json] [previous report.json]
+    # The extractor prints its progress, keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmark()
+    if len(sys.argv) >= 2:
+        with open(sys.argv[1], 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if len(sys.argv) >= 3:
+        with open(sys.argv[2], encoding='utf-8') as f:
+            print(json.dumps(compare_benchmarks(json.load(f), report), indent=2))
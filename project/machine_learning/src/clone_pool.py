@@ -0,0 +1,238 @@
+import os
+import git
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import contextlib
+from typing import TypeVar, List
+
+T = TypeVar("T")
+
+###############################################################################
+#        Pool of git clones reused across jobs, evicted least recently used   #
+###############################################################################
+
+def clone_repository(git_repo_link: str, location: str, branch: str, depth: int, bare: bool=False,
+                     blob_limit: int=None) -> None:
+    """Clone a repository into location
+
+    Keyword Arguments:
+    git_repo_link -- link to the git repository
+    location -- the directory the repository is cloned into
+    branch -- the branch to clone
+    depth -- the number of commits to clone
+    bare -- clone without a working tree
+    blob_limit -- size in bytes above which blobs are left out of the clone, every blob is fetched if not given
+    """
+    options = []
+    if blob_limit is not None:
+        options.append('--filter=blob:limit=' + str(blob_limit))
+
+    git.Repo.clone_from(git_repo_link, location, bare=bare, branch=branch, depth=depth, multi_options=options)
+
+
+def update_repository(location: str, branch: str, depth: int, bare: bool=False) -> None:
+    """Fetch the latest commits of the branch of a clone and move the clone onto them
+
+    Keyword Arguments:
+    location -- the directory of the clone
+    branch -- the branch the clone follows
+    depth -- the number of commits to fetch
+    bare -- whether the clone has no working tree
+    """
+    with git.Repo(location) as git_repo:
+        if bare:
+            git_repo.git.fetch('origin', '+refs/heads/' + branch + ':refs/heads/' + branch, depth=depth)
+        else:
+            git_repo.git.fetch('origin', branch, depth=depth)
+            git_repo.git.reset('--hard', 'FETCH_HEAD')
+            git_repo.git.clean('-ffdx')
+
+
+def get_directory_size(directory: str) -> int:
+    res = 0
+    for root, directories, files in os.walk(directory):
+        for file in files:
+            try:
+                res += os.lstat(os.path.join(root, file)).st_size
+            except OSError:
+                pass
+
+    return res
+
+
+class clone_pool:
+    """Clones of repositories shared by the jobs of every worker of a machine
+
+    A clone is kept per repository, branch, depth and clone mode. Later jobs fetch
+    into the existing clone instead of cloning again. Every clone has a lock
+    file: it is held exclusively while the clone is created or updated, and
+    shared while a job reads it. The mtime of the lock file records the last
+    use of the clone. Once the pool is larger than max_bytes, or a clone has
+    not been used for max_age seconds, the least recently used clones no job
+    is reading are removed.
+    """
+
+    def __init__(self, directory: str, max_bytes: int=2 * 1024 ** 3, max_age: float=24 * 60 * 60,
+                 fetch_interval: float=0) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.fetch_interval = fetch_interval
+        self.clones = 0
+        self.fetches = 0
+        self.reuses = 0
+        os.makedirs(directory, exist_ok=True)
+
+
+    def get_key(self, repo_url: str, branch: str, depth: int=1, bare: bool=False, blob_limit: int=None) -> str:
+        """Get the name a clone is stored under in the pool"""
+        specification = json.dumps([repo_url, branch, depth, bare, blob_limit])
+        return hashlib.sha1(specification.encode('utf-8')).hexdigest()
+
+
+    @contextlib.contextmanager
+    def checkout(self, repo_url: str, branch: str, depth: int=1, bare: bool=False, blob_limit: int=None):
+        """Context giving the location of an up to date clone of the branch of a repository
+
+        The clone is not modified by another job until the context exits. It
+        is prepared again if another job evicted it before it was locked for
+        reading.
+
+        Keyword Arguments:
+        repo_url -- link to the git repository
+        branch -- the branch to clone
+        depth -- the number of commits to clone or fetch, the whole history if None
+        bare -- clone without a working tree
+        blob_limit -- size in bytes above which blobs are left out of the clone, every blob is fetched if not given
+        """
+        key = self.get_key(repo_url, branch, depth, bare, blob_limit)
+        location = os.path.join(self.directory, key)
+
+        with open(location + '.lock', 'a+') as lock:
+            try:
+                while True:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                    self.prepare(location, repo_url, branch, depth, bare, blob_limit)
+                    # Going from the exclusive to the shared lock releases it for a moment, evict may remove the clone
+                    fcntl.flock(lock, fcntl.LOCK_SH)
+                    if self.read_metadata(location) is not None and os.path.isdir(location):
+                        break
+
+                yield location
+            finally:
+                os.utime(lock.name)
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        self.evict()
+
+
+    def prepare(self, location: str, repo_url: str, branch: str, depth: int, bare: bool, blob_limit: int) -> None:
+        """Clone or update the clone at location, the caller holding its lock exclusively"""
+        metadata = self.read_metadata(location)
+
+        if metadata is not None and os.path.isdir(location):
+            if time.time() - metadata['fetched'] < self.fetch_interval:
+                self.reuses += 1
+                return
+            try:
+                update_repository(location, branch, depth, bare)
+                self.fetches += 1
+                self.write_metadata(location, repo_url, branch)
+                return
+            except git.exc.GitError as e:
+                print("fetch failed, cloning again:", e)
+
+        self.remove(location)
+        try:
+            clone_repository(repo_url, location, branch, depth, bare, blob_limit)
+        except Exception:
+            self.remove(location)
+            raise
+
+        self.clones += 1
+        self.write_metadata(location, repo_url, branch)
+
+
+    def read_metadata(self, location: str) -> dict:
+        try:
+            with open(location + '.json', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def write_metadata(self, location: str, repo_url: str, branch: str) -> None:
+        metadata = {'repo_url': repo_url, 'branch': branch, 'fetched': time.time(),
+                    'size': get_directory_size(location)}
+        with open(location + '.json.tmp', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        os.replace(location + '.json.tmp', location + '.json')
+
+
+    def remove(self, location: str) -> None:
+        """Remove a clone and its metadata, the caller holding its lock exclusively"""
+        shutil.rmtree(location, ignore_errors=True)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(location + '.json')
+
+
+    def get_entries(self) -> List[T]:
+        """Get the (last used, size, location) of every clone of the pool, least recently used first"""
+        res = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.lock'):
+                continue
+
+            location = entry.path[:-len('.lock')]
+            metadata = self.read_metadata(location)
+            if metadata is None:
+                continue
+            try:
+                res.append((entry.stat().st_mtime, metadata['size'], location))
+            except FileNotFoundError:
+                pass
+
+        return sorted(res)
+
+
+    def evict(self) -> int:
+        """Remove the clones past max_age and the least recently used ones above max_bytes
+
+        Clones a job is reading are skipped, returns how many clones were removed.
+        """
+        entries = self.get_entries()
+        total = sum(size for used, size, location in entries)
+        now = time.time()
+        removed = 0
+
+        for used, size, location in entries:
+            if total <= self.max_bytes and now - used <= self.max_age:
+                continue
+
+            with open(location + '.lock', 'a+') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+
+                # The lock file stays, removing it would let two jobs lock different files
+                self.remove(location)
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+            total -= size
+            removed += 1
+
+        return removed
+
+
+    def clear(self) -> int:
+        """Remove every clone no job is reading, returns how many were removed"""
+        max_bytes, max_age = self.max_bytes, self.max_age
+        self.max_bytes, self.max_age = -1, -1
+        try:
+            return self.evict()
+        finally:
+            self.max_bytes, self.max_age = max_bytes, max_age
@@ -0,0 +1,159 @@
+import sqlite3
+import json
+import time
+from typing import TypeVar, List
+
+T = TypeVar("T")
+
+class comment_cache:
+    """Persistent key value cache of comments stored in sqlite
+
+    Every entry remembers when it was last used, and the least recently used
+    entries are evicted whenever new entries written take the cache above
+    max_entries, so a long lived worker does not grow it without bound.
+
+    Lookups only read the database. The entries put and the use of the
+    entries found are buffered and written batch_size at a time in a short
+    transaction, so jobs sharing the database do not wait on each other for
+    a whole extraction. A database that stays locked is a cache miss, and
+    the writes it refuses are dropped, never a failure of the job.
+    """
+    tablename = 'comment_cache'
+
+    def __init__(self, database: str, max_entries: int=200000, tablename: str=None, batch_size: int=1000,
+                 timeout: float=30):
+        """
+        Keyword Arguments:
+        database -- the sqlite database file
+        max_entries -- the number of entries above which the least recently used ones are evicted
+        tablename -- the table of the entries, comment_cache if not given
+        batch_size -- the number of buffered writes above which they are written
+        timeout -- the seconds to wait for a lock held by another connection
+        """
+        if tablename != None:
+            self.tablename = tablename
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        # Entries put and time of the last use of the entries found, not written yet
+        self.pending = {}
+        self.used = {}
+        # The cache may be handed to the thread extracting comments, it is never used by two threads at once
+        self.connection = sqlite3.connect(database, timeout=timeout, check_same_thread=False)
+        self.cur = self.connection.cursor()
+        self.execute("create table if not exists " + self.tablename +
+                     " (key text primary key, value text, last_used real)")
+        self.execute("create index if not exists " + self.tablename + "_last_used on " +
+                     self.tablename + " (last_used)")
+        self.connection.commit()
+
+
+    def get(self, key: str) -> List[T]:
+        """Get the value stored under a key, None if it is not cached
+
+        Keyword Arguments:
+        key -- the key of the value
+        """
+        if key in self.pending:
+            self.hits += 1
+            value = self.pending[key][0]
+            self.pending[key] = (value, time.time())
+            return json.loads(value)
+
+        try:
+            row = self.cur.execute("select value from " + self.tablename + " where key = ?", (key,)).fetchone()
+        except sqlite3.OperationalError as e:
+            print("comment cache not read:", e)
+            row = None
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.used[key] = time.time()
+        if len(self.used) >= self.batch_size:
+            self.commit()
+        return json.loads(row[0])
+
+
+    def put(self, key: str, value: List[T]) -> None:
+        """Store a JSON serialisable value under a key
+
+        Keyword Arguments:
+        key -- the key of the value
+        value -- the value to store
+        """
+        self.pending[key] = (json.dumps(value), time.time())
+        self.used.pop(key, None)
+        if len(self.pending) >= self.batch_size:
+            self.commit()
+
+
+    def evict(self) -> int:
+        """Remove the least recently used entries above max_entries, returns how many were removed"""
+        self.write()
+        return self.remove_excess()
+
+
+    def remove_excess(self) -> int:
+        try:
+            count = self.cur.execute("select count(*) from " + self.tablename).fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return 0
+
+            self.cur.execute("delete from " + self.tablename + " where key in (select key from " +
+                             self.tablename + " order by last_used asc limit ?)", (excess,))
+            self.connection.commit()
+        except sqlite3.OperationalError as e:
+            print("comment cache not evicted:", e)
+            self.connection.rollback()
+            return 0
+
+        return excess
+
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+
+    def execute(self, query: str) -> None:
+        self.cur.execute(query)
+
+
+    def commit(self) -> None:
+        """Write the buffered entries and uses, then evict if new entries were written"""
+        if self.write():
+            self.remove_excess()
+
+
+    def write(self) -> bool:
+        """Write the buffered entries and uses in one transaction, returns whether new entries were written"""
+        if not self.pending and not self.used:
+            return False
+
+        wrote_entries = False
+        try:
+            self.cur.executemany("insert or replace into " + self.tablename + " (key, value, last_used) values (?, ?, ?)",
+                                 [(key, value, last_used) for key, (value, last_used) in self.pending.items()])
+            self.cur.executemany("update " + self.tablename + " set last_used = ? where key = ?",
+                                 [(last_used, key) for key, last_used in self.used.items()])
+            self.connection.commit()
+            wrote_entries = len(self.pending) > 0
+        except sqlite3.OperationalError as e:
+            # The database stayed locked, the writes are dropped
+            print("comment cache not written:", e)
+            self.connection.rollback()
+        self.pending.clear()
+        self.used.clear()
+        return wrote_entries
+
+
+    def close(self) -> None:
+        self.evict()
+        self.connection.close()
@@ -0,0 +1,212 @@
+import re
+from typing import TypeVar, List, Callable
+
+T = TypeVar("T")
+
+###############################################################################
+#         Compiled comment scanner for a language of extractor.languages      #
+###############################################################################
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+class comment_scanner():
+    """Scans lines of source code for comments of a single language
+
+    The delimiters of the language are compiled once, so that scanning a line
+    costs a handful of regex searches instead of rebuilding a sliding window
+    at every column. The comments found are the same as the ones of
+    extractor.extract_comment_from_line_list.
+    """
+
+    max_comment_length = 100
+
+    def __init__(self, language: dict) -> None:
+        self.language = language
+        self.name = language['language']
+        self.single_line = language['single_line']
+
+        self.single_line_finders = [(sexp, self._compile_finder(sexp)) for sexp in self.single_line]
+
+        self.multiline_start = language['multiline_start']
+        self.multiline_end = language['multiline_end']
+        self.multiline_start_finder = self._compile_finder(self.multiline_start)
+        self.multiline_end_finder = self._compile_finder(self.multiline_end)
+
+        symbols = set(self.multiline_start) | set(self.multiline_end)
+        self.symbol_table = dict((ord(char), None) for char in symbols)
+
+
+    @staticmethod
+    def _compile_finder(sexp: str):
+        """Compile a pattern finding every, possibly overlapping, occurrence of sexp"""
+        return re.compile("(?=" + re.escape(sexp) + ")")
+
+
+    def find_text_enclosed_inside(self, line: str) -> str:
+        """Find the text of a line enclosed inside the single line s-expressions
+
+        Keyword Arguments:
+        line -- the line from which to find the enclosed text
+        """
+        line_comment_active = False
+        res = []
+        line_length = len(line)
+
+        for sexp, finder in self.single_line_finders:
+            positions = [match.start() for match in finder.finditer(line)]
+            # Columns before this one are followed by a whole s-expression wide window
+            full_window_end = line_length - len(sexp) + 1
+
+            for which_position, position in enumerate(positions):
+                line_comment_active = not line_comment_active
+                if not line_comment_active:
+                    continue
+
+                if which_position + 1 < len(positions):
+                    end = positions[which_position + 1]
+                else:
+                    end = line_length
+
+                res.append(line[position + 1:min(end, full_window_end)])
+
+                if end == line_length:
+                    for which_line_column in range(max(position + 1, full_window_end), line_length):
+                        if line[which_line_column:] not in sexp:
+                            res.append(line[which_line_column])
+
+        return "".join(res).lstrip(" ")
+
+
+    def triggers_multiline_comment(self, line: str) -> bool:
+        """Checks if a line opens or closes a multi-line comment
+
+        Keyword Arguments:
+        line -- the line to examine
+        """
+        count = len(self.multiline_start_finder.findall(line))
+
+        if self.multiline_start != self.multiline_end:
+            start_length = len(self.multiline_start)
+            end_length = len(self.multiline_end)
+            if end_length == start_length:
+                count += len(self.multiline_end_finder.findall(line))
+            elif end_length < start_length and line.endswith(self.multiline_end):
+                count += 1
+
+        return count % 2 == 1
+
+
+    def strip_comment_of_symbols(self, comment: str) -> str:
+        """Strip the comment of all the symbols of the multi-line delimiters
+
+        Keyword Arguments:
+        comment -- A string of comment
+        """
+        return comment.strip("\n").translate(self.symbol_table)
+
+
+    def clean(self, comment: str) -> str:
+        return self.strip_comment_of_symbols(comment).lstrip(" ")
+
+
+    def check_if_comment_is_empty(self, comment: str) -> bool:
+        comment = self.strip_comment_of_symbols(comment)
+        for symbol in self.single_line:
+            comment = comment.strip(symbol)
+            comment = comment.strip(" ")
+
+        return comment in ('', '\n')
+
+
+    def save_in_dict(self, line: str, location: str) -> dict:
+        return {'line': line, 'location': location, 'language': self.name}
+
+
+    def scan(self, lines: List[T]) -> List[T]:
+        """Scans a list of lines as returned by extractor.get_every_line_from_file
+
+        Keyword Arguments:
+        lines -- list of dictionaries containing the line and its location
+        """
+        return self.scan_text([line['line'] for line in lines], lambda line_num: lines[line_num]['location'])
+
+
+    def scan_buffer(self, buffer: str, filename: str) -> List[T]:
+        """Scans the whole content of a file
+
+        Keyword Arguments:
+        buffer -- the decoded content of the file
+        filename -- the file the content comes from
+        """
+        buffer = buffer.replace("\r\n", "\n").replace("\r", "\n")
+        lines = buffer.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+
+        return self.scan_text(lines, lambda line_num: filename + ": " + str(line_num + 1))
+
+
+    def scan_text(self, lines: List[str], get_location: Callable[[int], str]) -> List[T]:
+        """Scans lines of text for comments
+
+        Keyword Arguments:
+        lines -- the lines of text without their line ending
+        get_location -- function returning the location of a line from its index
+        """
+        res = []
+        multiline_comment = False
+        next_line_is_comment = False
+        single_multiline_comment = ""
+        multiple_singleline_comment = ""
+        number_of_lines = len(lines)
+
+        if number_of_lines > 0:
+            nextline_enclosed = self.find_text_enclosed_inside(lines[0])
+            nextline_singleline_comment = self.clean(nextline_enclosed)
+
+        for line_num in range(number_of_lines):
+            comment = None
+            line = lines[line_num]
+            enclosed = nextline_enclosed
+
+            if line_num + 1 < number_of_lines:
+                current_singleline_comment = nextline_singleline_comment
+                nextline_enclosed = self.find_text_enclosed_inside(lines[line_num + 1])
+                nextline_singleline_comment = self.clean(nextline_enclosed)
+                if nextline_singleline_comment != "":
+                    next_line_is_comment = True
+                    multiple_singleline_comment += current_singleline_comment + " "
+                elif next_line_is_comment:
+                    next_line_is_comment = False
+                    multiple_singleline_comment += current_singleline_comment
+                    comment = multiple_singleline_comment
+                    multiple_singleline_comment = ""
+
+            if self.triggers_multiline_comment(line):
+                if not multiline_comment:
+                    multiline_comment = True
+                elif not next_line_is_comment:
+                    single_multiline_comment += self.clean(line)
+                    comment = single_multiline_comment
+                    single_multiline_comment = ""
+                    multiline_comment = False
+
+            if multiline_comment:
+                single_multiline_comment += self.clean(line) + " "
+            elif comment is None and not next_line_is_comment:
+                comment = enclosed
+
+            if comment is not None:
+                comment = self.clean(comment)
+                if comment != "" and not self.check_if_comment_is_empty(comment):
+                    if len(WORD_PATTERN.findall(comment)) <= self.max_comment_length:
+                        res.append(self.save_in_dict(comment, get_location(line_num)))
+
+        if next_line_is_comment:
+            multiple_singleline_comment += nextline_singleline_comment + " "
+            comment = self.clean(multiple_singleline_comment)
+            if len(WORD_PATTERN.findall(comment)) <= self.max_comment_length:
+                res.append(self.save_in_dict(comment, get_location(number_of_lines - 1)))
+
+        return res
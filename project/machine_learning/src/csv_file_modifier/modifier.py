@@ -89,33 +89,7 @@ class csv_modifier():
         file_name -- name of the file to search for
         path -- path from which to search the file
         """
-        # print("Searching in path: " + path + " for " + file_name)
-        res = []
-        for root, dirs, files in os.walk(path):
-            # print("root dir is ", root)
-            if file_name[0] == cls.WILDCARD_IDENTIFIER:
-                for file in files:
-                    same_format = check_file_is_same_format(file_name, file)
-                    if same_format:
-                        if root[-1] != "/" and file[0] != "/":
-                            res.append(root + "/" + file)
-                        else:
-                            res.append(root + file)
-            else:
-                for file in files:
-                    if file == file_name:
-                        if root[-1] != "/" and file[0] != "/":
-                            res.append(root + "/" + file)
-                        else:
-                            res.append(root + file)
-
-                if "file" in locals():
-                    found = file.find(file_name)
-                    if found != -1:
-                        break
-                else:
-                    break
-        return res
+        return file_index(path).search_file(file_name)
 
     @staticmethod
     def check_file_is_same_format(file_one: List[T], file_two: List[T]) -> bool:
@@ -125,25 +99,7 @@ class csv_modifier():
         file_one -- the first file in the comparison
         file_two -- the second file in the comparison
         """
-
-        # Get the file format of first file ###########################################
-        counter = 1
-        first_fileformat = ""
-        while file_one[-counter] != "." and counter < len(file_one):
-            first_fileformat = first_fileformat + file_one[-counter]
-            counter += 1
-
-        # Get the file format of second file ###########################################
-        counter = 1
-        second_fileformat = ""
-        while file_two[-counter] != "." and counter < len(file_two):
-            second_fileformat = second_fileformat + file_two[-counter]
-            counter += 1
-
-        if second_fileformat == first_fileformat:
-            return True
-
-        return False
+        return file_index.get_file_format(file_one) == file_index.get_file_format(file_two)
 
 
     def create_csv_file(self, fieldnames: List[T], base_file_name: str, savedir: str="./") -> str:
@@ -160,13 +116,14 @@ class csv_modifier():
 
     def find_next_filename(self, base_file_name, savedir: str='./', filetype: str='csv'):
         counter = 0
+        existing_files = file_index(savedir)
 
         while True:
             filename = base_file_name + str( counter ) + "." + filetype
 
             save_loc = os.path.join(savedir, filename)
 
-            if len(self.search_file(filename, savedir)) == 0:
+            if len(existing_files.search_file(filename)) == 0:
                 return filename
 
             counter += 1
@@ -197,3 +154,79 @@ class csv_modifier():
         pass
 
 
+
+
+class file_index():
+    """Index of every file below a root directory, built with one walk of os.scandir
+
+    Files can then be looked up by format or by name without walking the
+    directory again. Files are kept in the order os.walk would list them.
+    """
+
+    WILDCARD_IDENTIFIER = "*"
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.files = []
+        self.by_format = {}
+        self.by_name = {}
+        self.index_directory(path)
+
+
+    @staticmethod
+    def get_file_format(filename: str) -> str:
+        """Get the format of a file, i.e. everything after its last dot
+
+        Keyword Arguments:
+        filename -- the name of the file
+        """
+        return filename[max(filename.rfind('.'), 0) + 1:]
+
+
+    def index_directory(self, path: str) -> None:
+        directories = [path]
+        while directories:
+            directory = directories.pop()
+            subdirectories = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            is_directory = entry.is_dir()
+                        except OSError:
+                            is_directory = False
+
+                        if not is_directory:
+                            self.add_file(entry.path, entry.name)
+                        elif not entry.is_symlink():
+                            subdirectories.append(entry.path)
+            except OSError:
+                continue
+
+            directories.extend(reversed(subdirectories))
+
+
+    def add_file(self, path: str, name: str=None) -> None:
+        """Add a file to the index
+
+        Keyword Arguments:
+        path -- the path of the file
+        name -- the name of the file, taken from the path if not given
+        """
+        if name is None:
+            name = os.path.basename(path)
+        self.files.append(path)
+        self.by_format.setdefault(self.get_file_format(name), []).append(path)
+        self.by_name.setdefault(name, []).append(path)
+
+
+    def search_file(self, file_name: str) -> List[T]:
+        """Search the index for a file, or for every file of a format given as *format
+
+        Keyword Arguments:
+        file_name -- name of the file to search for
+        """
+        if file_name[0] == self.WILDCARD_IDENTIFIER:
+            return list(self.by_format.get(self.get_file_format(file_name), []))
+
+        return list(self.by_name.get(file_name, []))
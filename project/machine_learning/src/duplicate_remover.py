@@ -8,6 +8,7 @@ import inspect
 import sys
 sys.path.append('../../')
 import project.machine_learning.src.extractor as app
+from project.machine_learning.src.csv_file_modifier.modifier import file_index
 
 T = TypeVar("T")
 
@@ -83,10 +84,11 @@ class comment_database:
     def create_csv_file(self, fieldnames: List[T], savedir: str) -> str:
         # fieldnames = ['line', 'location', 'language', 'value', 'category', "keywords", "description"]
         counter = 0
+        existing_files = file_index(savedir)
 
         while True:
             filename = "removed_duplicates_commentfile" + str( counter ) + ".csv"
-            if len(app.search_file(filename, savedir)) == 0:
+            if len(existing_files.search_file(filename)) == 0:
                 f = open(os.path.join(savedir, filename ), "w")
                 writer = csv.DictWriter(f, fieldnames=fieldnames)
                 writer.writeheader()
@@ -147,13 +149,7 @@ class comment_database:
 
     @staticmethod
     def _get_all_file_in_dir(path: str) -> List[T]:
-        list_of_files = []
-
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                list_of_files.append(os.path.join(root,file))
-
-        return list_of_files
+        return list(file_index(path).files)
 
 
     @staticmethod
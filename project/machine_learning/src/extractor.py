@@ -4,11 +4,26 @@ import csv
 import re
 import tempfile
 import linecache
+import tokenize
 import shutil
 import tempfile
 import chardet
-from typing import TypeVar, Generic, List, NewType
-from project.machine_learning.src.csv_file_modifier.modifier import csv_modifier
+import codecs
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import json
+import mmap
+import io
+import tarfile
+import zipfile
+from typing import TypeVar, Generic, List, NewType, Iterable
+from project.machine_learning.src.csv_file_modifier.modifier import csv_modifier, file_index
+from project.machine_learning.src.comment_scanner import comment_scanner
+from project.machine_learning.src.comment_cache import comment_cache
+from project.machine_learning.src.source_filter import source_filter
+from project.machine_learning.src.clone_pool import clone_pool, clone_repository
 
 T = TypeVar("T")
 ###############################################################################
@@ -17,6 +32,23 @@ T = TypeVar("T")
 
 WILDCARD_IDENTIFIER = '*'
 
+# The maximum line of code for each csv file ###################################
+MAX_LINE_PER_FILE = 50000
+
+# Bump whenever the extracted comments change, this invalidates comment caches #
+EXTRACTOR_VERSION = 3
+
+# Bytes chardet looks at to guess the encoding of a file that is not UTF-8 ####
+ENCODING_SAMPLE_SIZE = 64 * 1024
+MAX_DETECTED_ENCODINGS = 10000
+
+# Mode of the symbolic links of a git tree, whose blob is the link target #####
+SYMLINK_MODE = 0o120000
+
+# Header of a hunk of a patch, giving the first removed and added line #######
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@')
+HISTORY_FIELDNAMES = ['line', 'location', 'language', 'change', 'commit', 'author', 'date']
+
 languages = {
     "c": {
         "multiline_start": '\/\*',
@@ -184,23 +216,652 @@ makefile_comment = languages['makefile']
 shell_comment = languages['shell']
 perl_comment = languages['perl']
 
+language_by_format = {languages[key]['format']: languages[key] for key in languages}
+
+# Compiled scanners, one per language, built on first use #####################
+scanners = {}
+singleline_patterns = {}
+multiline_patterns = {}
+
+# Encodings chardet detected, keyed by git blob SHA ############################
+detected_encodings = collections.OrderedDict()
+
+
+def get_comment_from_repo_using_all_languages(repo: str, branch: str, output_dir: str, workers: int=None, cache: comment_cache=None,
+                                              file_filter: source_filter=None, bare: bool=False, blob_limit: int=None,
+                                              pool: clone_pool=None) -> list:
+    """Extracts the comments of every language from a repository
+
+    The repository is cloned once and its tree walked once, every file being
+    sent to the language its format belongs to.
 
-def get_comment_from_repo_using_all_languages(repo: str, branch: str, output_dir: str) -> list:
+    Keyword arguments:
+    repo -- link to the git repository
+    branch -- the branch to clone
+    output_dir -- the directory the comment files are written to
+    workers -- number of processes extracting the files, serial if not given
+    cache -- cache of the comments of previously extracted blobs
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    bare -- read the blobs from a bare clone instead of checking out a working tree
+    blob_limit -- size in bytes above which a bare clone leaves blobs out, every blob is fetched if not given
+    pool -- pool of clones reused across jobs, the repository is cloned into a temporary directory if not given
     """
+    comments_per_file = iter_comment_from_repo(repo, branch, workers, cache, file_filter, bare, blob_limit, pool)
+    return write_comment_shards(comments_per_file, output_dir, languages.values())
+
+def get_comment_from_path_using_all_languages(directory: str, output_dir: str, workers: int=None, cache: comment_cache=None,
+                                              file_filter: source_filter=None) -> list:
+    return extract_comment_from_snapshot(directory, output_dir, extract_comment_from_file_lines, workers, cache,
+                                         file_filter=file_filter)
+
+
+def iter_comment_from_repo(repo: str, branch: str, workers: int=None, cache: comment_cache=None,
+                           file_filter: source_filter=None, bare: bool=False, blob_limit: int=None,
+                           pool: clone_pool=None) -> Iterable[List[T]]:
+    """Yields the comments of every file of a repository, a list of comments per file
+
     Keyword arguments:
-    repo --
-    branch --
-    output_dir --
+    repo -- link to the git repository
+    branch -- the branch to clone
+    workers -- number of processes extracting the files, serial if not given
+    cache -- cache of the comments of previously extracted blobs
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    bare -- read the blobs from a bare clone instead of checking out a working tree, workers are then unused
+    blob_limit -- size in bytes above which a bare clone leaves blobs out, every blob is fetched if not given
+    pool -- pool of clones reused across jobs, the repository is cloned into a temporary directory if not given
     """
-    files = []
-    for key in languages:
-        files.append(extract_comment_from_repo(repo, branch, languages[key], output_dir))
+    depth = 1
+
+    if bare:
+        yield from iter_comment_from_bare_repo(repo, branch, depth, cache, file_filter, blob_limit, pool)
+        return
+
+    with repo_snapshot(repo, branch, depth, pool=pool) as location:
+        blob_shas = get_blob_shas(location) if cache is not None else None
+
+        yield from iter_comment_from_snapshot(location, extract_all_comment_from_file, workers, cache, blob_shas, file_filter,
+                                              tracked=True)
+
+
+@contextlib.contextmanager
+def repo_snapshot(repo: str, branch: str, depth: int, bare: bool=False, blob_limit: int=None, pool: clone_pool=None):
+    """Context giving the location of a clone of a repository, removed on exit unless it is pooled
+
+    Keyword Arguments:
+    repo -- link to the git repository
+    branch -- the branch to clone
+    depth -- the number of commits to clone
+    bare -- clone without a working tree
+    blob_limit -- size in bytes above which blobs are left out of the clone, every blob is fetched if not given
+    pool -- pool of clones reused across jobs, the repository is cloned into a temporary directory if not given
+    """
+    if pool is not None:
+        with pool.checkout(repo, branch, depth, bare, blob_limit) as location:
+            yield location
+        return
+
+    location = tempfile.mkdtemp()
+    try:
+        clone_repository(repo, location, branch, depth, bare, blob_limit)
+        yield location
+    finally:
+        shutil.rmtree(location, ignore_errors=True)
+
+
+def get_file_format(filename: str) -> str:
+    """Get the format of a file, i.e. everything after its last dot
+
+    Keyword Arguments:
+    filename -- the name of the file
+    """
+    return file_index.get_file_format(filename)
+
+
+def get_language_from_file(filename: str) -> dict:
+    """Get the language a file is written in from its format, None if unknown
+
+    Keyword Arguments:
+    filename -- the name of the file
+    """
+    return language_by_format.get(get_file_format(filename))
+
+
+def extract_comment_from_snapshot(directory: str, output_dir: str, extract_file, workers: int=None,
+                                  cache: comment_cache=None, blob_shas: dict=None, file_filter: source_filter=None) -> list:
+    """Extracts the comments of every language from a directory in a single walk
+
+    Keyword Arguments:
+
+    directory -- the root directory to search from
+    output_dir -- the directory the comment files are written to
+    extract_file -- function extracting the comments of a file given its language
+    workers -- number of processes extracting the files, serial if not given
+    cache -- cache of the comments of previously extracted blobs
+    blob_shas -- the git blob SHA of the files, hashed from their content if missing
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    """
+    comments_per_file = iter_comment_from_snapshot(directory, extract_file, workers, cache, blob_shas, file_filter)
+
+    return write_comment_shards(comments_per_file, output_dir, languages.values())
+
+
+def iter_comment_from_snapshot(directory: str, extract_file, workers: int=None,
+                               cache: comment_cache=None, blob_shas: dict=None,
+                               file_filter: source_filter=None, tracked: bool=False) -> Iterable[List[T]]:
+    """Yields the comments of every file of a directory, a list of comments per file
+
+    Keyword Arguments:
+
+    directory -- the root directory to search from
+    extract_file -- function extracting the comments of a file given its language
+    workers -- number of processes extracting the files, serial if not given
+    cache -- cache of the comments of previously extracted blobs
+    blob_shas -- the git blob SHA of the files, hashed from their content if missing
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    tracked -- whether every file of the directory is tracked by git, as in a clone, so .gitignore does not apply
+    """
+    source_files = []
+    file_languages = []
+    for file in file_index(directory).files:
+        language = get_language_from_file(os.path.basename(file))
+        if language is None:
+            continue
+        if file_filter is not None and not file_filter.is_extractable(directory, file, tracked):
+            continue
+
+        source_files.append(file)
+        file_languages.append(language)
+
+    yield from map_cached_comment_extraction(extract_file, source_files, file_languages, cache, blob_shas, workers)
+
+
+def iter_comment_from_bare_repo(repo: str, branch: str, depth: int, cache: comment_cache=None,
+                                file_filter: source_filter=None, blob_limit: int=None,
+                                pool: clone_pool=None) -> Iterable[List[T]]:
+    """Yields the comments of every file of a repository without checking it out
+
+    The repository is cloned bare, its tree is listed and only the blobs of
+    known formats are read from the object database into memory. The
+    comments are located in repo/path of the file.
+
+    Keyword Arguments:
+
+    repo -- link to the git repository
+    branch -- the branch to clone
+    depth -- the number of commits to clone
+    cache -- cache of the comments of previously extracted blobs
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    blob_limit -- size in bytes above which blobs are left out of the clone, every blob is fetched if not given
+    pool -- pool of clones reused across jobs, the repository is cloned into a temporary directory if not given
+    """
+    with repo_snapshot(repo, branch, depth, True, blob_limit, pool) as location:
+        yield from iter_comment_from_object_database(location, 'HEAD', repo, cache, file_filter)
+
+
+def iter_comment_from_object_database(git_directory: str, revision: str='HEAD', name: str=None, cache: comment_cache=None,
+                                      file_filter: source_filter=None) -> Iterable[List[T]]:
+    """Yields the comments of every file of a revision read from the object database of a repository
+
+    Blobs a partial clone left out are skipped rather than fetched. The
+    comments are located in name/path of the file. The .gitattributes rules
+    the file filter applies are read from the root of the tree, as there may
+    be no working tree to read them from. Every file of the tree being
+    tracked, the .gitignore does not apply.
+
+    Keyword Arguments:
+
+    git_directory -- the git directory of the repository, bare or not
+    revision -- the revision whose tree is read
+    name -- the name the files are located in, git_directory if not given
+    cache -- cache of the comments of previously extracted blobs
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    """
+    if name is None:
+        name = git_directory
+
+    with git.Repo(git_directory) as git_repo:
+        blob_sizes = get_present_blob_sizes(git_repo)
+        tree = git_repo.commit(revision).tree
+        root = name + "@" + tree.hexsha
+        if file_filter is not None:
+            file_filter.get_rules(root, lambda filename: read_tree_file(tree, filename), tracked=True)
+
+        for item in tree.traverse():
+            if item.type != 'blob' or item.mode == SYMLINK_MODE:
+                continue
+            if get_language_from_file(item.name) is None:
+                continue
+
+            size = blob_sizes.get(item.hexsha)
+            if size is None:
+                # Only blobs above the blob limit are left out of a partial clone
+                if file_filter is not None:
+                    file_filter.count('size', 0)
+                continue
+
+            comments = extract_comment_from_archive_member(
+                name, item.path, size, lambda: git_repo.odb.stream(item.binsha).read(), file_filter, cache, item.hexsha,
+                root)
+            if comments is not None:
+                yield comments
+
+    if cache is not None:
+        cache.commit()
+
+
+def read_tree_file(tree: git.Tree, filename: str) -> bytes:
+    """Get the content of a file of a git tree, None if the tree has no such blob or a partial clone left it out
+
+    Keyword Arguments:
+
+    tree -- the tree holding the file
+    filename -- the path of the file inside the tree
+    """
+    try:
+        item = tree[filename]
+        if item.type != 'blob':
+            return None
+        return item.data_stream.read()
+    except (KeyError, ValueError, git.exc.GitError):
+        return None
+
+
+def get_present_blob_sizes(git_repo: git.Repo) -> dict:
+    """Map the blobs present in the object database of a repository to their size
+
+    Objects missing from a partial clone are not listed, nor fetched.
+    """
+    res = {}
+    objects = git_repo.git.cat_file('--batch-all-objects', '--batch-check=%(objectname) %(objecttype) %(objectsize)')
+    for line in objects.splitlines():
+        sha, object_type, size = line.split()
+        if object_type == 'blob':
+            res[sha] = int(size)
+
+    return res
+
+
+def get_comment_history_from_repo(repo: str, branch: str, output_dir: str, revisions: str=None, max_count: int=None,
+                                  file_filter: source_filter=None, pool: clone_pool=None) -> str:
+    """Writes the comments added and removed by every commit of a repository into a comment history file
+
+    Keyword Arguments:
+    repo -- link to the git repository
+    branch -- the branch to clone
+    output_dir -- the directory the comment history file is written to
+    revisions -- the range of commits to walk, e.g. v1.0..v2.0, every commit of the branch if not given
+    max_count -- the number of most recent commits of the range to walk, every one if not given
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    pool -- pool of clones reused across jobs, the repository is cloned into a temporary directory if not given
+    """
+    filename = os.path.join(output_dir, csv_modifier().find_next_filename(base_file_name="commenthistory", savedir=output_dir))
+    with open(filename, "w", encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=HISTORY_FIELDNAMES)
+        writer.writeheader()
+        for comments in iter_comment_from_history(repo, branch, revisions, max_count, file_filter, pool):
+            writer.writerows(comments)
+
+    return filename
+
+
+def iter_comment_from_history(repo: str, branch: str, revisions: str=None, max_count: int=None,
+                              file_filter: source_filter=None, pool: clone_pool=None) -> Iterable[List[T]]:
+    """Yields the comments added and removed by every commit of a repository, a list of comments per file changed
+
+    The whole history of the branch is cloned bare, once.
+
+    Keyword Arguments:
+    repo -- link to the git repository
+    branch -- the branch to clone
+    revisions -- the range of commits to walk, e.g. v1.0..v2.0, every commit of the branch if not given
+    max_count -- the number of most recent commits of the range to walk, every one if not given
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    pool -- pool of clones reused across jobs, the repository is cloned into a temporary directory if not given
+    """
+    with repo_snapshot(repo, branch, None, True, None, pool) as location:
+        yield from iter_comment_from_commits(location, revisions or 'HEAD', repo, max_count, file_filter)
+
+
+def iter_comment_from_commits(git_directory: str, revisions: str='HEAD', name: str=None, max_count: int=None,
+                              file_filter: source_filter=None) -> Iterable[List[T]]:
+    """Yields the comments added and removed by every commit of a range, oldest commit first
+
+    Only the hunks a commit changes, diffed against its first parent, are
+    scanned, so the cost follows the churn rather than the size of the tree.
+    A comment is only seen if the hunk holds all of it, and comments a commit
+    removes and adds back unchanged, i.e. moves inside a file, are left out.
+
+    Keyword Arguments:
+    git_directory -- the git directory of the repository, bare or not
+    revisions -- the range of commits to walk
+    name -- the name the files are located in, git_directory if not given
+    max_count -- the number of most recent commits of the range to walk, every one if not given
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    """
+    if name is None:
+        name = git_directory
+
+    with git.Repo(git_directory) as git_repo:
+        for commit in git_repo.iter_commits(revisions, max_count=max_count, reverse=True):
+            if commit.parents:
+                diffs = commit.parents[0].diff(commit, create_patch=True, unified=0)
+            else:
+                diffs = commit.diff(git.NULL_TREE, create_patch=True, unified=0)
+
+            for diff in diffs:
+                comments = extract_comment_from_diff(diff, commit, name, file_filter)
+                if comments:
+                    yield comments
+
+
+def extract_comment_from_diff(diff: git.Diff, commit: git.Commit, name: str, file_filter: source_filter=None) -> List[T]:
+    """Extracts the comments the changed hunks of the diff of a file add and remove
+
+    Keyword Arguments:
+    diff -- the zero context diff of the file
+    commit -- the commit the diff belongs to
+    name -- the name the files are located in
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    """
+    path = diff.b_path or diff.a_path
+    language = get_language_from_file(os.path.basename(path))
+    if language is None or not diff.diff:
+        return []
+    if file_filter is not None and not file_filter.is_extractable_content(path, len(diff.diff), lambda: diff.diff):
+        return []
+
+    scanner = get_scanner(language)
+    comments = {'added': [], 'removed': []}
+    for change, start, lines in get_changed_hunks(diff.diff.decode('utf-8', errors='replace')):
+        location = name + "/" + (diff.b_path if change == 'added' else diff.a_path) + ": "
+        comments[change].extend(scanner.scan_text(lines, lambda line_num: location + str(start + line_num)))
+
+    moved = (collections.Counter(comment['line'] for comment in comments['added']) &
+             collections.Counter(comment['line'] for comment in comments['removed']))
+
+    res = []
+    metadata = {'commit': commit.hexsha, 'author': commit.author.name, 'date': commit.authored_datetime.isoformat()}
+    for change in ('removed', 'added'):
+        skipped = collections.Counter(moved)
+        for comment in comments[change]:
+            if skipped[comment['line']] > 0:
+                skipped[comment['line']] -= 1
+                continue
+            comment['change'] = change
+            comment.update(metadata)
+            res.append(comment)
+
+    return res
+
+
+def get_changed_hunks(patch: str) -> List[T]:
+    """Get the (change, first line number, lines) of the removed and added lines of every hunk of a patch
+
+    Keyword Arguments:
+    patch -- the zero context unified diff of a file
+    """
+    res = []
+    for line in patch.split('\n'):
+        header = HUNK_HEADER.match(line)
+        if header is not None:
+            res.append(('removed', int(header.group(1)), []))
+            res.append(('added', int(header.group(2)), []))
+        elif res and line.startswith('-'):
+            res[-2][2].append(line[1:].rstrip('\r'))
+        elif res and line.startswith('+'):
+            res[-1][2].append(line[1:].rstrip('\r'))
+
+    return [hunk for hunk in res if hunk[2]]
+
+
+def iter_comment_from_local(path: str, workers: int=None, cache: comment_cache=None,
+                            file_filter: source_filter=None) -> Iterable[List[T]]:
+    """Yields the comments of every file of a local directory or archive, a list of comments per file
+
+    Keyword Arguments:
+
+    path -- the directory, or the tar or zip archive
+    workers -- number of processes extracting the files of a directory, serial if not given
+    cache -- cache of the comments of previously extracted blobs of a directory
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    """
+    if os.path.isdir(path):
+        yield from iter_comment_from_snapshot(path, extract_all_comment_from_file, workers, cache, None, file_filter)
+    else:
+        yield from iter_comment_from_archive(path, file_filter=file_filter)
+
+
+def iter_comment_from_archive(archive, name: str=None, file_filter: source_filter=None) -> Iterable[List[T]]:
+    """Yields the comments of every file of a tar or zip archive, a list of comments per file
+
+    Members are read one at a time into memory, the archive is never unpacked
+    to disk. The comments are located in name/path of the member. The file
+    filter applies no .gitignore or .gitattributes rule to the members, a
+    streamed tar archive possibly holding them after the files they match.
+
+    Keyword Arguments:
+
+    archive -- path to the archive, or a file object reading it
+    name -- the name of the archive, its path if not given
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    """
+    if name is None:
+        name = archive if isinstance(archive, str) else getattr(archive, 'name', 'archive')
+
+    if zipfile.is_zipfile(archive):
+        if not isinstance(archive, str):
+            archive.seek(0)
+        with zipfile.ZipFile(archive) as zip_archive:
+            for info in zip_archive.infolist():
+                if not info.is_dir():
+                    comments = extract_comment_from_archive_member(
+                        name, info.filename, info.file_size, lambda: zip_archive.read(info), file_filter)
+                    if comments is not None:
+                        yield comments
+        return
+
+    if isinstance(archive, str):
+        tar_archive = tarfile.open(archive, mode='r:*')
+    else:
+        archive.seek(0)
+        tar_archive = tarfile.open(fileobj=archive, mode='r|*')
+
+    with tar_archive:
+        for member in tar_archive:
+            if member.isfile():
+                comments = extract_comment_from_archive_member(
+                    name, member.name, member.size, lambda: tar_archive.extractfile(member).read(), file_filter)
+                if comments is not None:
+                    yield comments
+
+
+def extract_comment_from_archive_member(name: str, member_name: str, size: int, read_member,
+                                        file_filter: source_filter=None, cache: comment_cache=None,
+                                        blob_sha: str=None, root: str=None) -> List[T]:
+    """Extracts the comments of a member of an archive or git tree, None if it is not extracted
+
+    Keyword Arguments:
+
+    name -- the name of the archive
+    member_name -- the path of the member inside the archive
+    size -- the size of the member in bytes
+    read_member -- function reading the content of the member
+    file_filter -- filter skipping files not worth extracting, every file is extracted if not given
+    cache -- cache of the comments of previously extracted blobs, nothing is cached if not given
+    blob_sha -- the git blob SHA of the member, hashed from its content if needed
+    root -- the name of the tree of the member, whose rules the file filter read, no rule applies if not given
+    """
+    language = get_language_from_file(os.path.basename(member_name))
+    if language is None:
+        return None
+
+    content = []
+    def read() -> bytes:
+        if not content:
+            content.append(read_member())
+        return content[0]
+
+    if file_filter is not None and not file_filter.is_extractable_content(member_name, size, read, root):
+        return None
+
+    location = name + "/" + member_name
+    if cache is None:
+        return extract_all_comment_from_content(read(), location, language, blob_sha)
+
+    if blob_sha is None:
+        blob_sha = git_blob_sha(read())
+
+    # Shares its entries with the files extract_all_comment_from_file reads from disk
+    key = get_cache_key(location, language, extract_all_comment_from_file, {location: blob_sha})
+    cached = cache.get(key)
+    if cached is not None:
+        return [save_in_dict(line, location + suffix, language['language']) for line, suffix in cached]
+
+    comments = extract_all_comment_from_content(read(), location, language, blob_sha)
+    cache.put(key, [[comment['line'], comment['location'][len(location):]] for comment in comments])
+    return comments
+
+
+def write_comment_shards(comments_per_file: Iterable[List[T]], output_dir: str, shard_languages: Iterable[dict]=()) -> list:
+    """Writes the comments of every file into comment files, returns the comment files
+
+    Keyword Arguments:
+
+    comments_per_file -- the comments to write, a list of comments per file
+    output_dir -- the directory the comment files are written to
+    shard_languages -- languages a comment file is created for even without comments
+    """
+    writer = comment_file_writer(output_dir, shard_languages)
+    try:
+        for comments_in_file in comments_per_file:
+            writer.write(comments_in_file)
+    finally:
+        writer.close()
+
+    return writer.files
+
+
+def map_comment_extraction(extract_file, files: List[str], file_languages: List[dict], workers: int=None) -> Iterable[List[T]]:
+    """Extracts the comments of every file, yielding them in the order of the files
+
+    With more than one worker the files are sharded across a process pool.
+
+    Keyword Arguments:
+
+    extract_file -- function extracting the comments of a file given its language
+    files -- the files to extract the comments from
+    file_languages -- the language of each file
+    workers -- number of processes extracting the files, serial if not given
+    """
+    if workers is None or workers <= 1 or len(files) <= 1:
+        for file, language in zip(files, file_languages):
+            yield extract_file(file, language)
+        return
 
-    return files
+    chunksize = max(1, len(files) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(extract_file, files, file_languages, chunksize=chunksize)
 
-def get_comment_from_path_using_all_languages(directory: str, output_dir: str):
-    for key in languages:
-        extract_comment_from_path(directory, languages[key], output_dir)
+
+def map_cached_comment_extraction(extract_file, files: List[str], file_languages: List[dict], cache: comment_cache=None,
+                                  blob_shas: dict=None, workers: int=None) -> Iterable[List[T]]:
+    """Extracts the comments of every file, only extracting blobs that are not cached
+
+    Identical blobs are only extracted once per run, the comments of the
+    others are copied with their location adjusted.
+
+    Keyword Arguments:
+
+    extract_file -- function extracting the comments of a file given its language
+    files -- the files to extract the comments from
+    file_languages -- the language of each file
+    cache -- cache of the comments of previously extracted blobs, nothing is cached if not given
+    blob_shas -- the git blob SHA of the files, hashed from their content if missing
+    workers -- number of processes extracting the files, serial if not given
+    """
+    if cache is None:
+        yield from map_comment_extraction(extract_file, files, file_languages, workers)
+        return
+
+    keys = []
+    known = {}
+    missing_files = []
+    missing_languages = []
+    for file, language in zip(files, file_languages):
+        key = get_cache_key(file, language, extract_file, blob_shas)
+        keys.append(key)
+        if key in known:
+            continue
+
+        comments = cache.get(key) if key is not None else None
+        if comments is None:
+            missing_files.append(file)
+            missing_languages.append(language)
+        if key is not None:
+            known[key] = comments
+
+    extracted = map_comment_extraction(extract_file, missing_files, missing_languages, workers)
+    for file, language, key in zip(files, file_languages, keys):
+        if key is None:
+            yield next(extracted)
+        elif known[key] is None:
+            comments = next(extracted)
+            known[key] = [[comment['line'], comment['location'][len(file):]] for comment in comments]
+            cache.put(key, known[key])
+            yield comments
+        else:
+            yield [save_in_dict(line, file + location, language['language']) for line, location in known[key]]
+
+    cache.commit()
+
+
+def get_cache_key(filename: str, language: dict, extract_file, blob_shas: dict=None) -> str:
+    """Get the key the comments of a file are cached under, None if it cannot be read
+
+    Keyword Arguments:
+
+    filename -- the file to get the key of
+    language -- the language the file is written in
+    extract_file -- function extracting the comments of a file given its language
+    blob_shas -- the git blob SHA of the files, hashed from their content if missing
+    """
+    blob_sha = blob_shas.get(filename) if blob_shas else None
+    if blob_sha is None:
+        try:
+            with open(filename, 'rb') as f:
+                blob_sha = git_blob_sha(f.read())
+        except OSError:
+            return None
+
+    specification = json.dumps(language, sort_keys=True) + str(EXTRACTOR_VERSION)
+    specification = hashlib.sha1(specification.encode('utf-8')).hexdigest()
+
+    return blob_sha + ':' + extract_file.__name__ + ':' + specification
+
+
+def git_blob_sha(data: bytes) -> str:
+    """Get the SHA git stores a blob with the given content under"""
+    return hashlib.sha1(b"blob " + str(len(data)).encode() + b"\0" + data).hexdigest()
+
+
+def get_blob_shas(directory: str) -> dict:
+    """Map the files tracked by the git repository at directory to their blob SHA
+
+    Keyword Arguments:
+    directory -- root of the git working tree
+    """
+    res = {}
+    try:
+        entries = git.Repo(directory).git.ls_files('-s', '-z')
+    except (git.exc.InvalidGitRepositoryError, git.exc.NoSuchPathError, git.exc.GitCommandError):
+        return res
+
+    for entry in entries.split('\0'):
+        if entry != '':
+            info, path = entry.split('\t', 1)
+            res[os.path.join(directory, path)] = info.split()[1]
+
+    return res
 
 
 def save_in_dict(line: str, location: str, language: str) -> dict:
@@ -216,16 +877,17 @@ def iterate_dictionary_for_header(dictionary: dict) -> List[T]:
 
 
 def get_snapshot_from_git(git_repo_link: str, branch: str, depth: int) -> str:
+  """Clone a repository into a new temporary directory the caller has to remove, see repo_snapshot"""
   location = tempfile.mkdtemp() # Create temporary dir
-  git.Repo.clone_from(git_repo_link, location, branch=branch, depth=depth)
+  try:
+    clone_repository(git_repo_link, location, branch, depth)
+  except Exception:
+    shutil.rmtree(location, ignore_errors=True)
+    raise
   return location
-  # Copy desired file from temporary dir
-  # shutil.move(os.path.join(t, 'setup.py'), '.')
-  # # Remove temporary dir
-  # shutil.rmtree(t)
 
 
-def extract_comment_from_path(directory: str, language: dict, output_dir: str):
+def extract_comment_from_path(directory: str, language: dict, output_dir: str, workers: int=None):
     """Extracts all comments from file contained inside a path
 
     Keyword Arguments:
@@ -234,29 +896,18 @@ def extract_comment_from_path(directory: str, language: dict, output_dir: str):
     language
 
     language -- the programming language to search in
+    workers -- number of processes extracting the files, serial if not given
     """
     files = []
-    comment_dir = create_comment_file(language)
 
     files = files + search_file('*' + language["format"], directory)
 
-    line_counter = 0
-
-    # The maximum line of code for each csv file ###############################
-    max_line_per_file = 50000
-    for file in files:
-        if line_counter > max_line_per_file:
-            comment_dir = create_comment_file(language)
-            line_counter = 0
-
-        lines_in_file = get_every_line_from_file(file)
-        comments_in_file = extract_comment_from_line_list(lines_in_file, language)
+    comments_per_file = map_comment_extraction(extract_comment_from_file_lines, files, [language] * len(files), workers)
+    write_comment_shards(comments_per_file, output_dir, [language])
 
-        write_comment_file(comments_in_file, comment_dir)
-        line_counter += len(comments_in_file)
 
-
-def extract_comment_from_repo(repo: str, branch: str, language: dict, tmpdirname: str) -> str:
+def extract_comment_from_repo(repo: str, branch: str, language: dict, tmpdirname: str, workers: int=None,
+                              cache: comment_cache=None, pool: clone_pool=None) -> str:
     """Extracts all comments from file contained inside a path
 
     Keyword Arguments:
@@ -265,58 +916,82 @@ def extract_comment_from_repo(repo: str, branch: str, language: dict, tmpdirname
     language
 
     language -- the programming language to search in
+    workers -- number of processes extracting the files, serial if not given
+    cache -- cache of the comments of previously extracted blobs
+    pool -- pool of clones reused across jobs, the repository is cloned into a temporary directory if not given
     """
     depth = 1
-    line_counter = 0
-
-    tmp_directory = get_snapshot_from_git(repo, branch, depth)
 
-    files = []
+    with repo_snapshot(repo, branch, depth, pool=pool) as tmp_directory:
+        blob_shas = get_blob_shas(tmp_directory) if cache is not None else None
 
-    comment_dir = create_comment_file(language, tmpdirname)
+        files = []
 
-    files = files + search_file('*' + language["format"], tmp_directory)
+        files = files + search_file('*' + language["format"], tmp_directory)
 
-    # The maximum line of code for each csv file ###############################
-    max_line_per_file = 50000
-    for file in files:
-        if line_counter > max_line_per_file:
-            comment_dir = create_comment_file(language, tmpdirname)
-            line_counter = 0
+        comments_per_file = map_cached_comment_extraction(extract_all_comment_from_file, files, [language] * len(files),
+                                                          cache, blob_shas, workers)
 
-        # lines_in_file = get_every_line_from_file(file)
-        # comments_in_file = extract_comment_from_line_list(lines_in_file, language)
+        return write_comment_shards(comments_per_file, tmpdirname, [language])[-1]
 
-        comments_in_file = extract_all_comment_from_file(file, language)
-
-        write_comment_file(comments_in_file, comment_dir)
-        line_counter += len(comments_in_file)
 
+def get_every_multiline(filename: str, language: dict):
+    """Get the multi-line comments of a file
 
-    return comment_dir
+    The file is mapped into memory and searched as bytes, only the comments
+    found are decoded, so memory stays proportional to the largest comment
+    rather than to the file. Bytes that are not UTF-8 are replaced.
 
+    Keyword Arguments:
+    filename -- the file to read
+    language -- the language the file is written in
+    """
+    if 'strip' not in language:
+        return []
 
-def get_every_multiline(filename: str, language: dict):
+    pattern, text_pattern, normaliser = get_multiline_patterns(language)
     res = []
     try:
-        with open(filename, "r") as f:
-            a = f.read()
-            raw_multiline = re.findall(language["multiline_start"] + ".*?" + language["multiline_end"], a, flags=re.DOTALL)
+        with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for match in pattern.finditer(buffer):
+                comment = match.group().decode('utf-8', errors='replace')
+                res.append(normaliser.sub(' ', comment).strip())
+    except (OSError, ValueError):
+        # Empty files cannot be mapped
+        return []
 
-            for item in language['strip']:
-                raw_multiline = [re.sub(item, ' ', s) for s in raw_multiline]
+    return transform_list_to_dict_line(filename, res, language['language'])
 
-            c = [re.sub('\n', ' ', s) for s in raw_multiline]
-            c = [re.sub('\s+', ' ', s) for s in c]
-            final_multiline = [s.strip() for s in c]
 
-        f.close()
+def get_multiline_patterns(language: dict):
+    """Get the compiled multi-line comment pattern of a language for bytes and for text, and its normaliser
 
-        res = transform_list_to_dict_line(filename, final_multiline, language['language'])
-    except:
-        pass
+    Keyword Arguments:
+    language -- the language to match the comments of
+    """
+    key = language['language']
+    if key not in multiline_patterns:
+        pattern = language["multiline_start"] + ".*?" + language["multiline_end"]
+        # Every stripped symbol and run of whitespace becomes a single space in one pass
+        normaliser = re.compile('(?:' + '|'.join(language['strip']) + r'|\s)+')
+        multiline_patterns[key] = (re.compile(pattern.encode('utf-8'), flags=re.DOTALL),
+                                   re.compile(pattern, flags=re.DOTALL), normaliser)
 
-    return res
+    return multiline_patterns[key]
+
+
+def get_multiline_from_text(text: str, filename: str, language: dict) -> List[T]:
+    """Get the multi-line comments of the decoded content of a file
+
+    Keyword Arguments:
+    text -- the content of the file
+    filename -- the file the content comes from
+    language -- the language the file is written in
+    """
+    pattern, text_pattern, normaliser = get_multiline_patterns(language)
+    final_multiline = [normaliser.sub(' ', comment).strip() for comment in text_pattern.findall(text)]
+
+    return transform_list_to_dict_line(filename, final_multiline, language['language'])
 
 
 def transform_list_to_dict_line(filename: str, arr: list[str], language: str) -> dict:
@@ -327,32 +1002,61 @@ def transform_list_to_dict_line(filename: str, arr: list[str], language: str) ->
     return lines
 
 
-def get_every_singleline(filename: str, language: dict):
-    linecache.clearcache()
-    modifier = csv_modifier()
-    num_of_lines = modifier.get_number_of_lines_in_file(filename)
+def get_singleline_pattern(language: dict):
+    """Get the compiled pattern matching the single line comment of a language
+
+    Keyword Arguments:
+    language -- the language to match the comments of
+    """
+    key = language['single_line'][0]
+    if key not in singleline_patterns:
+        singleline_patterns[key] = re.compile("(?<=" + key + ").+?[\n\r]")
+
+    return singleline_patterns[key]
+
+
+def group_singleline_comments(lines: Iterable[str], language: dict) -> List[str]:
+    """Group consecutive lines of single line comments into one comment each
+
+    Keyword Arguments:
+    lines -- the lines to group, including their line ending
+    language -- the language the lines are written in
+    """
+    pattern = get_singleline_pattern(language)
     res = []
     count = 0
     prev = False
-    for i in range(num_of_lines):
-        try:
-            a = linecache.getline(filename, i)
-            b =  re.findall("(?<=" + language['single_line'][0] + ").+?[\n\r]", a)
-            if b != []:
-                b[0] = b[0].strip()
-                if b[0] != '':
-                    prev = True
-                    if len(res) <= count:
-                        res.append("")
-                        res[count] += b[0] + " "
-                    else:
-                        res[count] += b[0] + " "
-            else:
-                if prev == True:
-                    count += 1
-                prev = False
-        except:
-            pass
+    for line in lines:
+        b = pattern.search(line)
+        if b is not None:
+            comment = b.group().strip()
+            if comment != '':
+                prev = True
+                if len(res) <= count:
+                    res.append(comment + " ")
+                else:
+                    res[count] += comment + " "
+        else:
+            if prev == True:
+                count += 1
+            prev = False
+
+    return res
+
+
+def get_every_singleline(filename: str, language: dict):
+    """Get the single line comments of a file, streaming it one line at a time
+
+    Keyword Arguments:
+    filename -- the file to read
+    language -- the language the file is written in
+    """
+    res = []
+    try:
+        with tokenize.open(filename) as f:
+            res = group_singleline_comments(f, language)
+    except (OSError, UnicodeDecodeError, SyntaxError):
+        res = []
 
     res = transform_list_to_dict_line(filename, res, language['language'])
     return res
@@ -365,41 +1069,165 @@ def get_every_comment_from_file(filename: str, language: dict):
     return res
 
 
-def get_every_line_from_file(filename: str) -> List[T]:
-    ###############################################################################
-    #                         getting encoding of the file                        #
-    ###############################################################################
+def detect_encoding(data: bytes, blob_sha: str=None) -> str:
+    """Detect the encoding of the content of a file
 
+    Strict UTF-8 is tried first, chardet only looks at a sample of the
+    content of files that are not UTF-8, and its answer is cached per blob.
+
+    Keyword Arguments:
+    data -- the content of the file
+    blob_sha -- the git blob SHA of the content, hashed from it if not given
+    """
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+
+    try:
+        data.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    if blob_sha is None:
+        blob_sha = git_blob_sha(data)
+
+    if blob_sha in detected_encodings:
+        detected_encodings.move_to_end(blob_sha)
+        return detected_encodings[blob_sha]
+
+    encoding = chardet.detect(data[:ENCODING_SAMPLE_SIZE])['encoding']
+    detected_encodings[blob_sha] = encoding
+    if len(detected_encodings) > MAX_DETECTED_ENCODINGS:
+        detected_encodings.popitem(last=False)
+
+    return encoding
+
+
+def decode_file_content(data: bytes, filename: str, blob_sha: str=None) -> str:
+    """Decode the content of a file
+
+    Content chardet cannot guess, or that its guess does not decode, is
+    read as UTF-8 with replacement characters rather than dropped.
+
+    Keyword Arguments:
+    data -- the content of the file
+    filename -- the file the content comes from
+    blob_sha -- the git blob SHA of the content, hashed from it if not given
+    """
+    encoding = detect_encoding(data, blob_sha)
+    try:
+        return data.decode(encoding)
+    except (UnicodeDecodeError, LookupError, TypeError):
+        print("Trouble decoding file " + filename + " now attempting to use utf-8")
+
+    return data.decode('utf-8', errors='replace')
+
+
+def get_every_line_from_file(filename: str, blob_sha: str=None) -> List[T]:
+    """Get every line of a file along with its location
+
+    Keyword Arguments:
+    filename -- the file to read
+    blob_sha -- the git blob SHA of the file, hashed from its content if needed
+    """
     lines = []
     with open(filename, 'rb') as thefile:
-        encoding = chardet.detect(bytes(thefile.read()))['encoding']
+        text = decode_file_content(thefile.read(), filename, blob_sha)
+
+    if text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        lines = text.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+
+    for line_number in range(len(lines)):
+        lines[line_number] = {
+            'line': lines[line_number],
+            'location': filename + ": " + str(line_number+1)
+        }
 
-    try:
-        thefile = open(filename, 'r', encoding=encoding)
-        lines = thefile.readlines()
-    except:
-        try:
-            print("Trouble decoding file " + filename + " now attempting to use utf-8")
-            with open(filename, 'r', encoding="utf-8" ) as thefile:
-                lines = thefile.readlines()
-        except:  # UnsupportEncodingException:
-            print("failed to decode file" + filename)
-
-    if len(lines) != 0:
-        for line_number in range(len(lines)):  # enumerate(line)
-            lines[line_number] = {
-                'line': lines[line_number].strip('\n'),
-                'location': filename + ": " + str(line_number+1)
-            }
-    print(lines)
     return lines
 
 
 def extract_all_comment_from_file(filename:str, language: str):
-    singleline_comments = get_every_singleline(filename, language)
+    """Extracts the comments of a file
+
+    A UTF-8 file is streamed, one line at a time for the single line
+    comments and mapped into memory for the multi-line ones. Any other file
+    is read whole and decoded by extract_all_comment_from_content, so a blob
+    has the same comments on disk as in an archive or a git tree, which
+    share its cache entries.
+
+    Keyword Arguments:
+    filename -- the file to read
+    language -- the language the file is written in
+    """
+    try:
+        with open(filename, encoding='utf-8-sig') as f:
+            singleline_comments = group_singleline_comments(f, language)
+    except UnicodeDecodeError:
+        with open(filename, 'rb') as f:
+            return extract_all_comment_from_content(f.read(), filename, language)
+    except OSError:
+        singleline_comments = []
+
+    singleline_comments = transform_list_to_dict_line(filename, singleline_comments, language['language'])
     multiline_comments = get_every_multiline(filename, language)
-    res = singleline_comments + multiline_comments
-    return res
+    return singleline_comments + multiline_comments
+
+
+def extract_all_comment_from_content(data: bytes, filename: str, language: dict, blob_sha: str=None) -> List[T]:
+    """Extracts the comments of a file already read into memory
+
+    The comments are the ones extract_all_comment_from_file finds in the file.
+
+    Keyword Arguments:
+    data -- the content of the file
+    filename -- the name the comments are located in
+    language -- the language the file is written in
+    blob_sha -- the git blob SHA of the content, hashed from it if needed
+    """
+    text = decode_file_content(data, filename, blob_sha)
+    if text is None:
+        return []
+
+    singleline_comments = group_singleline_comments(io.StringIO(text, newline=None), language)
+    singleline_comments = transform_list_to_dict_line(filename, singleline_comments, language['language'])
+
+    multiline_comments = []
+    if 'strip' in language:
+        multiline_comments = get_multiline_from_text(text.replace("\r\n", "\n").replace("\r", "\n"), filename, language)
+
+    return singleline_comments + multiline_comments
+
+def get_scanner(language: dict) -> comment_scanner:
+    """Get the compiled comment scanner of a language
+
+    Keyword Arguments:
+    language -- the language to scan for
+    """
+    key = language['language']
+    if key not in scanners or scanners[key].language is not language:
+        scanners[key] = comment_scanner(language)
+
+    return scanners[key]
+
+
+def extract_comment_from_file_lines(filename: str, language: dict) -> List[T]:
+    """Extracts the comments of a file scanned line by line, decoded once without a dictionary per line
+
+    Keyword Arguments:
+    filename -- the file to read
+    language -- the language the file is written in
+    """
+    with open(filename, 'rb') as thefile:
+        text = decode_file_content(thefile.read(), filename)
+
+    if not text:
+        return []
+
+    return get_scanner(language).scan_buffer(text, filename)
+
 
 def extract_comment_from_line_list(lines: List[T], language: dict) -> List[T]:
     """extracts the comment from a list of lines
@@ -495,33 +1323,10 @@ def search_file(file_name: str, path: str) -> List[T]:
     """Search a root directory for a particular file
 
     Keyboard Arguments:
-    file_name -- name of the file to search for
+    file_name -- name of the file to search for, or *format for every file of a format
     path -- path from which to search the file
     """
-    # print("Searching in path: " + path + " for " + file_name)
-    res = []
-    for root, dirs, files in os.walk(path):
-        if file_name[0] == WILDCARD_IDENTIFIER:
-            for file in files:
-                same_format = check_file_is_same_format(file_name, file)
-                if same_format:
-                    if root[-1] != "/" and file[0] != "/":
-                        res.append(root + "/" + file)
-                    else:
-                        res.append(root + file)
-        else:
-            for file in files:
-                if file == file_name:
-                    if root[-1] != "/" and file[0] != "/":
-                        res.append(root + "/" + file)
-                    else:
-                        res.append(root + file)
-
-            found = file.find(file_name)
-
-            if found != -1:
-                break
-    return res
+    return file_index(path).search_file(file_name)
 
 
 def check_file_is_same_format(file_one: str, file_two:str) -> bool:
@@ -531,25 +1336,7 @@ def check_file_is_same_format(file_one: str, file_two:str) -> bool:
     file_one -- the first file in the comparison
     file_two -- the second file in the comparison
     """
-
-    # Get the file format of first file ###########################################
-    counter = 1
-    first_fileformat = ""
-    while file_one[-counter] != "." and counter < len(file_one):
-        first_fileformat = first_fileformat + file_one[-counter]
-        counter += 1
-
-    # Get the file format of second file ###########################################
-    counter = 1
-    second_fileformat = ""
-    while file_two[-counter] != "." and counter < len(file_two):
-        second_fileformat = second_fileformat + file_two[-counter]
-        counter += 1
-
-    if second_fileformat == first_fileformat:
-        return True
-
-    return False
+    return get_file_format(file_one) == get_file_format(file_two)
 
 
 def check_triggers_multiline_comment(line: str, multiline_sexp: str, multiline_closing_sexp: str) -> bool:
@@ -724,3 +1511,55 @@ def write_comment_file(lines_of_comment: List[T], target: str):
         writer = csv.DictWriter(file, fieldnames=fieldnames)
         writer.writerows(lines_of_comment)
     file.close()
+
+
+class comment_file_writer():
+    """Writes comments into commentfile*.csv files, keeping one open file per language
+
+    A new comment file is started for a language once its current one holds
+    more than MAX_LINE_PER_FILE comments.
+    """
+    fieldnames = ['line', 'location', 'language']
+
+    def __init__(self, output_dir: str, shard_languages: Iterable[dict]=()) -> None:
+        self.output_dir = output_dir
+        self.files = []
+        self.handles = {}
+        self.writers = {}
+        self.line_counters = {}
+        for language in shard_languages:
+            self.open_comment_file(language['language'])
+
+
+    def open_comment_file(self, key: str) -> None:
+        if key in self.handles:
+            self.handles[key].close()
+
+        comment_dir = create_comment_file(languages.get(key, {'language': key}), self.output_dir)
+        self.files.append(comment_dir)
+        self.handles[key] = open(comment_dir, "a", encoding='utf-8')
+        self.writers[key] = csv.DictWriter(self.handles[key], fieldnames=self.fieldnames)
+        self.line_counters[key] = 0
+
+
+    def write(self, comments_in_file: List[T]) -> None:
+        """Write the comments of a single file
+
+        Keyword Arguments:
+        comments_in_file -- the comment dictionaries of the file
+        """
+        if len(comments_in_file) == 0:
+            return
+
+        key = comments_in_file[0]['language']
+        if key not in self.handles or self.line_counters[key] > MAX_LINE_PER_FILE:
+            self.open_comment_file(key)
+
+        self.writers[key].writerows(comments_in_file)
+        self.line_counters[key] += len(comments_in_file)
+
+
+    def close(self) -> None:
+        for handle in self.handles.values():
+            handle.close()
+        self.handles = {}
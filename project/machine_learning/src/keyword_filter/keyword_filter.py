@@ -9,7 +9,7 @@ import chardet
 import sys
 import inspect
 sys.path.append('../../')
-from project.machine_learning.src.csv_file_modifier.modifier import csv_modifier
+from project.machine_learning.src.csv_file_modifier.modifier import csv_modifier, file_index
 from project.machine_learning.src.preprocessor import preprocess
 from typing import TypeVar, Generic, List, NewType
 
@@ -46,7 +46,7 @@ class keyword_filter():
 
 
     def search_file(self, filename: str) -> str:
-        return self.modifier.search_file(filename, "./")
+        return file_index("./").search_file(filename)
 
 
     @classmethod
@@ -172,20 +172,15 @@ class keyword_filter():
 
     @staticmethod
     def _get_all_file_in_dir(path: str) -> List[T]:
-        list_of_files = []
-
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                list_of_files.append(os.path.join(root,file))
-
-        return list_of_files
+        return list(file_index(path).files)
 
 
     def create_csv_file(self) -> str:
         counter = 0
+        existing_files = file_index("./")
         while True:
             filename = "filtered_commentfile" + str( counter ) + ".csv"
-            if len(self.search_file(filename)) == 0:
+            if len(existing_files.search_file(filename)) == 0:
                 f = open(filename, "w")
                 writer = csv.DictWriter(f, fieldnames=self.fieldnames)
                 writer.writeheader()
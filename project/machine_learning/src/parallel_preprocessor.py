@@ -0,0 +1,109 @@
+import os
+import math
+import billiard
+from typing import TypeVar, List
+from project.machine_learning.src import preprocessor
+from project.machine_learning.src.comment_cache import comment_cache
+from project.machine_learning.src.pipeline import iter_batches
+
+T = TypeVar("T")
+
+###############################################################################
+#       Preprocesses the comments of large jobs in a pool of processes        #
+###############################################################################
+
+# The preprocess of a worker process, created once when the worker starts
+worker_processor = None
+
+
+def init_worker(dictionary_file: str, options: dict) -> None:
+    """Create the preprocess of a worker process, loading the dictionary and the NLTK data once"""
+    global worker_processor
+    worker_processor = preprocessor.preprocess(None, 'line', dictionary_file, **options)
+    try:
+        worker_processor.process_comment('load the stopwords and tokeniser')
+    except LookupError as e:
+        print("NLTK data is missing:", e)
+
+
+def process_chunk(comments: List[str]) -> List[str]:
+    return worker_processor.process_comment_list(comments)
+
+
+def get_available_cores() -> int:
+    """Get the number of cores the process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def get_workers_per_task(concurrency: int) -> int:
+    """Get the number of preprocessing workers of a task sharing the cores with concurrency - 1 others, 1 at least"""
+    return max(1, get_available_cores() // max(1, concurrency))
+
+
+class parallel_preprocessor(preprocessor.preprocess):
+    """Preprocesses the comments of a Series in worker processes, in the order of its rows
+
+    Every worker creates its own preprocess when it starts, so word.pkl and
+    the NLTK data are loaded once per worker rather than once per chunk. The
+    comments process_series does not find in the cache are split into chunks
+    of at most chunk_size comments, as many as there are workers when they
+    are fewer, and only this process reads and writes the cache. The pool is
+    started by start, or on entering a with block, and kept until close. It
+    is a billiard pool, Celery worker processes being daemons that
+    multiprocessing does not let start processes.
+    """
+
+    def __init__(self, dictionary_file: str=None, workers: int=None, chunk_size: int=2000,
+                 cache: comment_cache=None, **options) -> None:
+        """
+        Keyword Arguments:
+        dictionary_file -- the dictionary every worker loads
+        workers -- the number of worker processes, the available cores if not given, none at all if 1
+        chunk_size -- the number of comments a worker is given at once at most
+        cache -- the cache of the processed comments
+        options -- the other arguments of preprocess
+        """
+        # The forked workers share the dictionary loaded here
+        super().__init__(None, 'line', dictionary_file, cache=cache, **options)
+        self.workers = workers or get_available_cores()
+        self.chunk_size = chunk_size
+        self.options = options
+        self.pool = None
+
+
+    def start(self) -> None:
+        if self.workers > 1 and self.pool is None:
+            self.pool = billiard.Pool(self.workers, init_worker, (self.dictionary_file, self.options))
+
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+    def process_comment_list(self, comments: List[str]) -> List[str]:
+        if self.workers <= 1 or not comments:
+            return super().process_comment_list(comments)
+
+        self.start()
+        chunk_size = max(1, min(self.chunk_size, math.ceil(len(comments) / self.workers)))
+        # A job per chunk, billiard crediting every result of a map to its first worker
+        jobs = [self.pool.apply_async(process_chunk, (chunk,)) for chunk in iter_batches(comments, chunk_size)]
+        res = []
+        for job in jobs:
+            res.extend(job.get())
+
+        return res
@@ -0,0 +1,132 @@
+import queue
+import threading
+from typing import TypeVar, List, Iterable, Callable
+
+T = TypeVar("T")
+
+###############################################################################
+#        Runs batches through stages that overlap, connected by bounded queues #
+###############################################################################
+
+END = object()
+
+
+class stage_failure:
+    """Carries the exception a stage raised down to the consumer of the pipeline"""
+
+    def __init__(self, exception: BaseException) -> None:
+        self.exception = exception
+
+
+def iter_batches(items: Iterable[T], batch_size: int) -> Iterable[List[T]]:
+    """Yields the items in lists of batch_size items, the last one possibly shorter
+
+    Keyword Arguments:
+    items -- the items to batch
+    batch_size -- the number of items of a batch
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def iter_pipeline(items: Iterable[T], stages: List[Callable], max_queued: int=4, threaded: bool=True) -> Iterable[T]:
+    """Yields every item once it went through all the stages, in the order of the items
+
+    The items are read, and every stage run, in a thread of its own so the
+    stages overlap: the last stage starts on the first item while the next
+    ones are still being read. Two stages are connected by a queue holding at
+    most max_queued items, a stage waiting for the next one rather than piling
+    its results up in memory. The first exception raised reading the items or
+    running a stage is raised again to the consumer.
+
+    Keyword Arguments:
+    items -- the items to run through the stages
+    stages -- functions each returning the item the next stage is given
+    max_queued -- the number of items that wait between two stages at most
+    threaded -- run the stages one after the other for every item, in the calling thread, if False
+    """
+    if not threaded:
+        for item in items:
+            for stage in stages:
+                item = stage(item)
+            yield item
+        return
+
+    stop = threading.Event()
+    queues = [queue.Queue(max_queued) for i in range(len(stages) + 1)]
+
+    def put(outbox: queue.Queue, item) -> bool:
+        while not stop.is_set():
+            try:
+                outbox.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def get(inbox: queue.Queue):
+        while not stop.is_set():
+            try:
+                return inbox.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+        return END
+
+    def read() -> None:
+        try:
+            for item in items:
+                if not put(queues[0], item):
+                    break
+        except BaseException as e:
+            put(queues[0], stage_failure(e))
+            return
+        finally:
+            # Lets a generator clean up when the consumer stopped early
+            if hasattr(items, 'close'):
+                items.close()
+
+        put(queues[0], END)
+
+    def run(stage: Callable, inbox: queue.Queue, outbox: queue.Queue) -> None:
+        while True:
+            item = get(inbox)
+            if item is END or isinstance(item, stage_failure):
+                put(outbox, item)
+                return
+
+            try:
+                item = stage(item)
+            except BaseException as e:
+                put(outbox, stage_failure(e))
+                return
+
+            if not put(outbox, item):
+                return
+
+    threads = [threading.Thread(target=read, daemon=True)]
+    for stage, inbox, outbox in zip(stages, queues, queues[1:]):
+        threads.append(threading.Thread(target=run, args=(stage, inbox, outbox), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is END:
+                return
+            if isinstance(item, stage_failure):
+                raise item.exception
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -5,7 +5,12 @@ import re
 import joblib
 import string
 import chardet
+import functools
 import linecache
+import time
+from collections import Counter
+import json
+import hashlib
 import pandas as pd
 # import git
 from typing import TypeVar, Generic, List, NewType
@@ -15,6 +20,8 @@ from nltk.stem import PorterStemmer
 from nltk import ngrams
 from io import StringIO
 from project.machine_learning.src.csv_file_modifier.modifier import csv_modifier as cm
+from project.machine_learning.src.spelling_corrector import spelling_corrector
+from project.machine_learning.src.comment_cache import comment_cache
 from nltk.metrics.distance import edit_distance
 
 # nltk.download('punkt')
@@ -30,14 +37,214 @@ from nltk import FreqDist
 
 T = TypeVar("T")
 
+# Changes whenever a comment is processed differently, the cached ones being processed again
+PREPROCESS_VERSION = 1
+
+# Symbols replaced by a space, the rest of the punctuation is removed #########
+SYMBOLS = ".()_-,\"':{}[]/\\+!?"
+SYMBOL_TABLE = str.maketrans(dict([(char, None) for char in string.punctuation] + [(char, " ") for char in SYMBOLS]))
+
+NUMBER_PATTERN = re.compile(r'\d+')
+WORD_PATTERN = re.compile(r'\w+')
+
+# Comments of more words are not processed, nor split when of more than
+# MAX_SPLIT_COMMENT_LENGTH words, and words longer than MAX_WORD_LENGTH are noise
+MAX_COMMENT_LENGTH = 100
+MAX_SPLIT_COMMENT_LENGTH = 40
+MAX_WORD_LENGTH = 18
+
+# Tokenisers of preprocess. nltk.word_tokenize splits sentences with Punkt and
+# runs the Treebank regexes, most of which match punctuation replace_sym_with_space
+# already removed. regex splits on white space, splits off the quotes and dashes
+# Treebank does and the contractions left without an apostrophe
+TOKENISERS = ('nltk', 'regex')
+TOKEN_PATTERN = re.compile(r"[«“‘„»”’\u2012-\u2015]|[^\s«“‘„»”’\u2012-\u2015]+")
+CONTRACTION_PATTERN = re.compile(r"(?i)\b(can(?=not\b)|gim(?=me\b)|gon(?=na\b)|got(?=ta\b)|lem(?=me\b)|wan(?=na(?:\s|$)))")
+
+# Rows of a CSV file read at once when counting the words of its comments
+FREQUENCY_CHUNK_SIZE = 10000
+
+# Stems of the most recent words, most words of comments being common ones ####
+STEM_CACHE_SIZE = 100000
+
+stemmer = PorterStemmer()
+stem_word = functools.lru_cache(maxsize=STEM_CACHE_SIZE)(stemmer.stem)
+
+
+# Words split_word knows besides the dictionary, and parts it never splits off
+SPLIT_VOCABULARY = ['coma', 'mark', 'runner', 'software', 'fixme', 'todo', 'coordinator', 'onboarding', 'announcing',
+                    'https', 'coord', 'beats', 'alives']
+SPLIT_COMMON_WORDS = frozenset(['ability', 'lied', "ting", "able", "cant", "fish", "ed", "ing", "gated"])
+
+
+# Words up to MIN_SPLIT_WORD_SIZE letters are never split, nor words longer than
+# MAX_SPLIT_WORD_SIZE, which are identifiers or noise rather than compounds
+MIN_SPLIT_WORD_SIZE = 5
+MAX_SPLIT_WORD_SIZE = 100
+SEGMENTATION_CACHE_SIZE = 200000
+
+
+def get_split_points(length: int, longest: int=None) -> List[int]:
+    """Get the points a word of a length is tried to be split at, in order
+
+    Keyword Arguments:
+    length -- the length of the word
+    longest -- the length of the longest word of the lexicon, a side longer than it cannot be a word
+    """
+    if longest is None or 2 * longest >= length:
+        return range(3, length - 1)
+
+    return list(range(3, longest + 1)) + list(range(max(longest + 1, length - longest), length - 1))
+
+
+def segment_word(word: str, lexicon: frozenset, common_words: frozenset, memo: dict, longest: int=None) -> (tuple, bool):
+    """Split a word into the words of the lexicon it is made of, returns its parts and whether it is made of words
+
+    A word of the lexicon is kept whole. Another one is split at the first
+    point from the left where either side is a word and the right side is
+    not one of common_words, provided its left side is itself made of words,
+    the right side being split in turn. Every substring is segmented once and
+    kept in memo, so the time is polynomial in the length of the word.
+
+    Keyword Arguments:
+    word -- the word to split
+    lexicon -- the words of the dictionary
+    common_words -- parts never split off on the right
+    memo -- the segmentations of the substrings seen so far
+    longest -- the length of the longest word of the lexicon, if known
+    """
+    if word in memo:
+        return memo[word]
+
+    res = ((word,), word in lexicon)
+    if not res[1] and MIN_SPLIT_WORD_SIZE < len(word) <= MAX_SPLIT_WORD_SIZE:
+        for i in get_split_points(len(word), longest):
+            left, right = word[:i], word[i:]
+            if (left in lexicon or right in lexicon) and right not in common_words:
+                left_parts, is_words = segment_word(left, lexicon, common_words, memo, longest)
+                if is_words:
+                    res = (left_parts + segment_word(right, lexicon, common_words, memo, longest)[0], True)
+                    break
+
+    memo[word] = res
+    return res
+
+
+def segment_word_compatible(word: str, lexicon: frozenset, common_words: frozenset, memo: dict,
+                            longest: int=None) -> (tuple, bool):
+    """Get the parts preprocess.aux_split_word appends for a word, and what it returns, memoised
+
+    aux_split_word keeps the parts of the first failed split it tries, and
+    loses every part after it, its failed attempts rebinding the list it
+    appends to rather than truncating it. Unlike aux_split_word, words longer
+    than MAX_SPLIT_WORD_SIZE are kept whole.
+
+    Keyword Arguments:
+    word -- the word to split
+    lexicon -- the words of the dictionary
+    common_words -- parts never split off on the right
+    memo -- the segmentations of the substrings seen so far
+    longest -- the length of the longest word of the lexicon, if known
+    """
+    if word in memo:
+        return memo[word]
+
+    if word in lexicon:
+        res = ((word,), True)
+    else:
+        res = None
+        parts = ()
+        appended = True
+        if MIN_SPLIT_WORD_SIZE < len(word) <= MAX_SPLIT_WORD_SIZE:
+            for i in get_split_points(len(word), longest):
+                left, right = word[:i], word[i:]
+                if (left in lexicon or right in lexicon) and right not in common_words:
+                    left_parts, is_words = segment_word_compatible(left, lexicon, common_words, memo, longest)
+                    right_parts, _ = segment_word_compatible(right, lexicon, common_words, memo, longest)
+                    if appended:
+                        parts = parts + left_parts + right_parts
+                    if is_words:
+                        res = (parts, True)
+                        break
+                    appended = False
+
+        if res is None:
+            res = (parts + (word,) if appended else parts, False)
+
+    memo[word] = res
+    return res
+
+
+@functools.lru_cache(maxsize=None)
+def load_dictionary(dictionary_file: str) -> (List[str], frozenset, int):
+    """Load the word list of a dictionary file, the lexicon split_word looks words up in and the length of its
+    longest word, once per file"""
+    correct_words = joblib.load(dictionary_file)
+    return (correct_words,) + get_lexicon(correct_words)
+
+
+@functools.lru_cache(maxsize=None)
+def load_spelling_corrector(dictionary_file: str) -> spelling_corrector:
+    """Index the word list of a dictionary file for spelling correction, once per file"""
+    return spelling_corrector(load_dictionary(dictionary_file)[0])
+
+
+def get_lexicon(correct_words: List[str]) -> (frozenset, int):
+    lexicon = frozenset(correct_words).union(SPLIT_VOCABULARY)
+    return lexicon, max(map(len, lexicon))
+
+
+@functools.lru_cache(maxsize=None)
+def get_english_stopwords() -> frozenset:
+    """Get the english stopwords of NLTK, loaded once"""
+    return frozenset(sw.words('english'))
+
+
+def regex_tokenise(sentence: str) -> List[str]:
+    """Tokenise a sentence whose punctuation was removed like nltk.word_tokenize, with two regexes"""
+    return TOKEN_PATTERN.findall(CONTRACTION_PATTERN.sub(r"\1 ", sentence))
+
+
+def write_frequency_dictionary(counts: Counter, filename: str) -> None:
+    """Write counts of words to a JSON file, the most frequent first"""
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(dict(counts.most_common()), f, ensure_ascii=False)
+
+
+def merge_frequency_dictionaries(filenames: List[str]) -> Counter:
+    """Add up the counts of words of JSON files written by write_frequency_dictionary"""
+    res = Counter()
+    for filename in filenames:
+        with open(filename, encoding="utf-8") as f:
+            res.update(json.load(f))
+
+    return res
+
+
 class preprocess():
 
-    def __init__(self, csv_file: str=None, field_to_process: str='line', dictionary_file: str=None) -> None:
+    def __init__(self, csv_file: str=None, field_to_process: str='line', dictionary_file: str=None,
+                 compatible_split: bool=True, spelling_correction: bool=False, cache: comment_cache=None,
+                 tokeniser: str='nltk') -> None:
+        if tokeniser not in TOKENISERS:
+            raise ValueError("unknown tokeniser " + repr(tokeniser) + ", expected one of " + ", ".join(TOKENISERS))
         self.field_to_process = field_to_process
+        self.tokeniser = tokeniser
+        self.cache = cache
+        self.compatible_split = compatible_split
+        self.spelling_correction = spelling_correction
+        self.segmentations = {}
         self.translate_table = dict((ord(char), None) for char in string.punctuation)
         print(dictionary_file)
+        self.dictionary_file = dictionary_file
+        self.correct_words = None
+        self.lexicon = None
+        self.longest_word = None
+        self.corrector = None
         if dictionary_file !=  None:
-            self.correct_words = joblib.load(dictionary_file)
+            self.correct_words, self.lexicon, self.longest_word = load_dictionary(dictionary_file)
+        self.lexicon_words = self.correct_words
+        self.corrector_words = self.correct_words
 
     def set_field_to_process(self, field_to_process: str='line'):
         self.field_to_process = field_to_process
@@ -54,6 +261,9 @@ class preprocess():
 
 
     def correct_spelling(self, word:str, vocabulary: list, min_word_size: int=1) -> ( str, bool ):
+        if vocabulary is self.correct_words:
+            return self.get_spelling_corrector().correct(word, min_word_size)
+
         if len(word) > min_word_size:
             temp = [(edit_distance(word, w),w) for w in vocabulary if w[0]==word[0]]
             sorted_temp = sorted(temp, key = lambda val:val[0])
@@ -100,19 +310,51 @@ class preprocess():
                 return False
 
 
+    def get_lexicon(self) -> frozenset:
+        """Get the set of correct_words and SPLIT_VOCABULARY, rebuilt when correct_words is replaced"""
+        if self.lexicon is None or self.lexicon_words is not self.correct_words:
+            self.lexicon, self.longest_word = get_lexicon(self.correct_words)
+            self.lexicon_words = self.correct_words
+            self.segmentations = {}
+
+        return self.lexicon
+
+
+    def get_spelling_corrector(self) -> spelling_corrector:
+        """Get the index of correct_words correct_spelling looks words up in, rebuilt when correct_words is replaced"""
+        if self.corrector is None or self.corrector_words is not self.correct_words:
+            if self.dictionary_file is not None and self.correct_words is load_dictionary(self.dictionary_file)[0]:
+                self.corrector = load_spelling_corrector(self.dictionary_file)
+            else:
+                self.corrector = spelling_corrector(self.correct_words)
+            self.corrector_words = self.correct_words
+
+        return self.corrector
+
+
     def split_word(self, sentence, is_list: bool=True) -> list:
 
         sentence = sentence.lower()
-        vocabulary = ['coma', 'mark', 'runner', 'software', 'fixme', 'todo', 'coordinator', 'onboarding', 'announcing', 'https', 'coord', 'beats', 'alives']
-        correct_words = self.correct_words + vocabulary
-        common = ['ability', 'lied', "ting", "able", "cant", "fish", "ed", "ing", "gated"]
+        correct_words = self.get_lexicon()
+        common = SPLIT_COMMON_WORDS
         res = []
         sentence = sentence.strip()
         if not is_list:
             sentence = [ x.strip() for x in sentence.split(' ') ]
 
+        segment = segment_word_compatible if self.compatible_split else segment_word
+        memo = self.segmentations.setdefault(segment, {})
+        if len(memo) > SEGMENTATION_CACHE_SIZE:
+            memo.clear()
+
         for word in sentence:
-            self.aux_split_word(word,correct_words, common, res)
+            if self.spelling_correction and word not in correct_words:
+                # A misspelled word is corrected rather than split into the words it looks made of
+                corrected, is_corrected = self.correct_spelling(word, self.correct_words, MIN_SPLIT_WORD_SIZE)
+                if is_corrected:
+                    res.append(corrected)
+                    continue
+            res.extend(segment(word, correct_words, common, memo, self.longest_word)[0])
         if is_list == False:
             tmp = ""
             for word in res:
@@ -124,9 +366,9 @@ class preprocess():
         return res
 
     def process_out_noise2(self, input: str) -> str:
-        max_word_length = 18
-        output = re.sub(r'\d+', 'number', input)
-        w = re.findall(r'\w+', output)
+        max_word_length = MAX_WORD_LENGTH
+        output = NUMBER_PATTERN.sub('number', input)
+        w = WORD_PATTERN.findall(output)
         res = ""
 
         for word in w:
@@ -139,44 +381,45 @@ class preprocess():
 
 
     def replace_sym_with_space(self, sentence: str) -> str:
-        symbols = ".()_-,\"':{}[]/\\+!?"
-        rep = dict((re.escape(k), " ") for k in symbols)
-        pattern = re.compile("|".join(rep.keys()))
-        text = pattern.sub(lambda m: rep[re.escape(m.group(0))], sentence)
-        text = text.translate(self.translate_table)
-        return text
+        return sentence.translate(SYMBOL_TABLE)
 
 
     def tokenise(self, sentence: str) -> List[str]:
+        if self.tokeniser == 'regex':
+            return regex_tokenise(sentence)
         return nltk.word_tokenize(sentence)
 
 
-    def create_dist_file(self, base_file_name: str="word_frequency_dictionary") -> str:
-        file_size = self.modified_csv_file.get_number_of_lines_in_file(self.filename)
+    def count_words(self, csv_file: str, counts: Counter=None, chunk_size: int=FREQUENCY_CHUNK_SIZE) -> Counter:
+        """Count the words of the processed comments of a CSV file, read once in chunks of rows
 
-        frequency_dictionary = {}
-        for i in range(2, file_size):
-            first_line = linecache.getline(self.filename, 1)
-            other_line = linecache.getline(self.filename, i)
-            f = StringIO(first_line + other_line)
+        Keyword Arguments:
+        csv_file -- the file, whose field_to_process column holds the comments
+        counts -- counts the words are added to, of other files or processes, new counts if not given
+        chunk_size -- the number of rows read at once
+        """
+        if counts is None:
+            counts = Counter()
 
-            line = csv.DictReader(f)
-            line = [single_line for single_line in line][0]
+        for chunk in pd.read_csv(csv_file, usecols=[self.field_to_process], dtype=str, keep_default_na=False,
+                                 chunksize=chunk_size):
+            for line, count in self.process_series(chunk[self.field_to_process]).value_counts().items():
+                for word, occurrences in Counter(line.split()).items():
+                    counts[word] += occurrences * count
 
-            freq_tri = FreqDist(self.process_comment(line)[1])
+        return counts
 
-            for keyword in freq_tri:
 
-                if keyword in frequency_dictionary:
-                    frequency_dictionary[keyword] += freq_tri[keyword]
-                else:
-                    frequency_dictionary.update({keyword : freq_tri[keyword]})
+    def create_dist_file(self, base_file_name: str="word_frequency_dictionary", savedir: str="./") -> str:
+        """Write the counts of the words of the processed comments of the opened CSV file to a JSON file
 
-        if frequency_dictionary:
-            newfile = self.modified_csv_file.create_csv_file(None, base_file_name, "json")
+        Returns the name of the file, None if there is no word.
+        """
+        frequency_dictionary = self.count_words(self.filename)
 
-            f = open(newfile, "a", encoding="utf-8")
-            f.write(str(frequency_dictionary))
+        if frequency_dictionary:
+            newfile = os.path.join(savedir, self.modified_csv_file.find_next_filename(base_file_name, savedir, "json"))
+            write_frequency_dictionary(frequency_dictionary, newfile)
 
             return newfile
 
@@ -185,44 +428,180 @@ class preprocess():
 
     @staticmethod
     def stem(word: str) -> str:
-        ps = PorterStemmer()
-        return ps.stem(word)
+        return stem_word(word)
 
 
     @staticmethod
     def is_stopword(word: str) -> bool:
-        stopwords = sw.words('english')
-        return word in stopwords
+        return word in get_english_stopwords()
+
+
+    @staticmethod
+    def normalise_tokens(tokens: List[str]) -> str:
+        """Lower case the tokens, drop the stopwords and stem the others, joined by spaces
+
+        Keyword Arguments:
+        tokens -- the tokens of a comment
+        """
+        stopwords = get_english_stopwords()
+        words = (token.lower() for token in tokens)
+        return " ".join(stem_word(word) for word in words if word not in stopwords)
 
 
     def process_comment(self, comment: str) -> List[T]:
+        if self.cache is not None:
+            key = self.get_cache_key(comment)
+            res = self.cache.get(key)
+            if res is None:
+                res = self.normalise_comment(comment)
+                self.cache.put(key, res)
+            return res, []
+
+        return self.normalise_comment(comment), []
+
+
+    def normalise_comment(self, comment: str) -> str:
         # source: https://stackoverflow.com/questions/15547409/how-to-get-rid-of-punctuation-using-nltk-tokenizer#15555162
 
         res = ""
-        res2 = []
-        max_comment_length = 100
-        comment_length = len(re.findall(r'\w+', comment))
+        max_comment_length = MAX_COMMENT_LENGTH
+        comment_length = len(WORD_PATTERN.findall(comment))
         if  comment_length <= max_comment_length:
 
             # print(comment)
             line = comment
             line = self.replace_sym_with_space(line)
-            if comment_length <= 40:
+            if comment_length <= MAX_SPLIT_COMMENT_LENGTH:
                 line = self.split_word(line, is_list=False)
             line = self.process_out_noise2(line)
             tokens = self.tokenise(line)
 
-            for word in tokens:
-                word = word.lower()
-                if not self.is_stopword(word):
-                    word = self.stem(word)
-                    if res != "":
-                        res = res + " " + word
-                    else:
-                        res = word
-                    # res2.append(word)
+            res = self.normalise_tokens(tokens)
+
+        return res
+
+
+    def process_series(self, comments: pd.Series) -> pd.Series:
+        """Get the first value process_comment returns for every comment of a Series, indexed like the Series
+
+        Every distinct comment is processed once, by process_comments, and its
+        result given to each row holding it.
+
+        Keyword Arguments:
+        comments -- the comments, strings
+        """
+        codes, uniques = pd.factorize(comments)
+        if (codes < 0).any():
+            raise TypeError("comments must be strings, not missing values")
+
+        res = pd.Series(self.process_comments(list(uniques)), dtype=object)
+        return pd.Series(res.to_numpy()[codes], index=comments.index, dtype=object)
+
+
+    def process_comments(self, comments: List[str]) -> List[str]:
+        """Get the first value process_comment returns for every comment of a list
+
+        The comments found in the cache are not processed again, the others
+        are processed by process_comment_list then cached. The cache is
+        committed before the processing and once the results are put, so no
+        write is pending while the comments are processed.
+
+        Keyword Arguments:
+        comments -- the comments
+        """
+        if self.cache is None:
+            return self.process_comment_list(comments)
+
+        keys = [self.get_cache_key(comment) for comment in comments]
+        res = [self.cache.get(key) for key in keys]
+        missing = [i for i, value in enumerate(res) if value is None]
+        self.cache.commit()
+
+        processed = self.process_comment_list([comments[i] for i in missing])
+        for i, value in zip(missing, processed):
+            res[i] = value
+            self.cache.put(keys[i], value)
+
+        self.cache.commit()
+        return res
+
+
+    def process_comment_list(self, comments: List[str]) -> List[str]:
+        """Get the first value process_comment returns for every comment of a list, without the cache
+
+        Keyword Arguments:
+        comments -- the comments
+        """
+        return ["" if line is None else self.normalise_tokens(self.tokenise(line))
+                for line in self.clean_comment_list(comments)]
+
+
+    def clean_comment_list(self, comments: List[str]) -> List[str]:
+        """Get the line process_comment tokenises for every comment of a list, None for the ones too long to be
+        processed
+
+        Words are counted, symbols replaced and numbers renamed by vectorised
+        .str operations, only the splitting going through Python per comment.
+
+        Keyword Arguments:
+        comments -- the comments
+        """
+        comments = pd.Series(comments, dtype=object)
+        res = [None] * len(comments)
+
+        lengths = comments.str.count(WORD_PATTERN.pattern)
+        kept = lengths <= MAX_COMMENT_LENGTH
+        lines = comments[kept].str.translate(SYMBOL_TABLE)
+        lines = pd.Series([self.split_word(line, is_list=False) if length <= MAX_SPLIT_COMMENT_LENGTH else line
+                           for line, length in zip(lines, lengths[kept])], index=lines.index, dtype=object)
+
+        # process_out_noise2 keeps a short line whole, and the words of at most MAX_WORD_LENGTH letters of the others
+        lines = lines.str.replace(NUMBER_PATTERN.pattern, 'number', regex=True)
+        short = (lines != '') & (lines.str.len() <= MAX_WORD_LENGTH)
+        words = lines.str.findall(WORD_PATTERN.pattern)
+        for i, line, is_short, line_words in zip(lines.index, lines, short, words):
+            res[i] = line if is_short else "".join(" " + word for word in line_words if len(word) <= MAX_WORD_LENGTH)
+
+        return res
+
+
+    def compare_tokenisers(self, comments: List[str], max_examples: int=20) -> dict:
+        """Tokenise the lines of the distinct comments with nltk and with the regex tokeniser, returns how often
+        and where they differ and how long each took
+
+        Keyword Arguments:
+        comments -- the sample of comments
+        max_examples -- the number of differing lines reported at most
+        """
+        lines = [line for line in self.clean_comment_list(list(dict.fromkeys(comments))) if line is not None]
+
+        start = time.perf_counter()
+        nltk_tokens = [nltk.word_tokenize(line) for line in lines]
+        nltk_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        regex_tokens = [regex_tokenise(line) for line in lines]
+        regex_seconds = time.perf_counter() - start
+
+        different = [(line, expected, tokens) for line, expected, tokens in zip(lines, nltk_tokens, regex_tokens)
+                     if expected != tokens]
+        # A difference the model does not see once the tokens are normalised
+        processed_different = [line for line, expected, tokens in different
+                               if self.normalise_tokens(expected) != self.normalise_tokens(tokens)]
+
+        return {'lines': len(lines), 'different': len(different), 'processed_different': len(processed_different),
+                'different_share': len(different) / len(lines) if lines else 0.0,
+                'nltk_seconds': nltk_seconds, 'regex_seconds': regex_seconds,
+                'examples': [{'line': line, 'nltk': expected, 'regex': tokens}
+                             for line, expected, tokens in different[:max_examples]]}
+
 
-        return res, res2
+    def get_cache_key(self, comment: str) -> str:
+        """Get the key the processed comment is cached under, changing with PREPROCESS_VERSION and the options"""
+        dictionary = os.path.basename(self.dictionary_file) if self.dictionary_file is not None else None
+        specification = json.dumps([PREPROCESS_VERSION, dictionary, self.compatible_split, self.spelling_correction,
+                                    self.tokeniser, comment])
+        return hashlib.sha1(specification.encode('utf-8')).hexdigest()
 
 
     def create_trigram(self, line: dict) -> List[T]:
@@ -265,7 +644,7 @@ class preprocess():
         # print(self.field_to_process)
         df['original_comment'] = df[self.field_to_process]
 
-        df['new_line'] = df[self.field_to_process].apply(lambda x: self.process_comment(x)[0])
+        df['new_line'] = self.process_series(df[self.field_to_process])
 
 
         df.to_csv(os.path.join(savedir, newfile), index=False)
@@ -0,0 +1,240 @@
+import os
+import fnmatch
+from collections import Counter
+from typing import TypeVar, List
+
+T = TypeVar("T")
+
+###############################################################################
+#      Skips vendored, generated, binary and huge files before extraction     #
+###############################################################################
+
+class source_filter():
+    """Decides which source files of a tree are worth extracting comments from
+
+    Vendored, generated, ignored, huge, binary and minified files are skipped, cheapest check first, and counted
+    per reason in skipped_files and skipped_bytes. Ignore and linguist rules come from the root .gitignore, for
+    trees git does not track, and .gitattributes. Archive members get no rules, only the other checks.
+    """
+
+    vendored_directories = ['node_modules', 'bower_components', 'vendor', 'third_party', 'site-packages']
+    generated_patterns = ['*.min.js', '*.min.css', '*-min.js', '*.bundle.js', '*_pb2.py', '*_pb2_grpc.py',
+                          '*.pb.cc', '*.pb.h', '*.pb.go', '*.generated.*', 'package-lock.json', 'yarn.lock']
+
+    def __init__(self, max_file_size: int=1024 * 1024, max_line_length: int=1000, sample_size: int=8192,
+                 use_gitignore: bool=True, use_gitattributes: bool=True) -> None:
+        self.max_file_size = max_file_size
+        self.max_line_length = max_line_length
+        self.sample_size = sample_size
+        self.use_gitignore = use_gitignore
+        self.use_gitattributes = use_gitattributes
+        self.rules = {}
+        self.skipped_files = Counter()
+        self.skipped_bytes = Counter()
+        self.kept_files = 0
+        self.kept_bytes = 0
+
+
+    def is_extractable(self, root: str, path: str, tracked: bool=False) -> bool:
+        """Check if the comments of a file should be extracted, counting the skipped ones
+
+        Keyword Arguments:
+        root -- the root of the tree the file belongs to
+        path -- the path of the file
+        tracked -- whether the files of the tree are tracked by git, as in a clone, so .gitignore does not apply
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+
+        relative_path = os.path.relpath(path, root).replace(os.sep, '/')
+        reason = self.get_skip_reason(relative_path, size, lambda: self.read_sample(path), root, tracked)
+        return self.count(reason, size)
+
+
+    def is_extractable_content(self, relative_path: str, size: int, read_sample, root: str=None) -> bool:
+        """Check if the comments of a file that is not on disk should be extracted
+
+        Keyword Arguments:
+        relative_path -- the path of the file inside its tree
+        size -- the size of the file in bytes
+        read_sample -- function returning the first bytes of the file, only called when needed
+        root -- the name of the tree, whose rules get_rules read beforehand, no rule applies if not given
+        """
+        reason = self.get_skip_reason(relative_path, size, read_sample, root)
+        return self.count(reason, size)
+
+
+    def count(self, reason: str, size: int) -> bool:
+        if reason is None:
+            self.kept_files += 1
+            self.kept_bytes += size
+            return True
+
+        self.skipped_files[reason] += 1
+        self.skipped_bytes[reason] += size
+        return False
+
+
+    def read_sample(self, path: str) -> bytes:
+        try:
+            with open(path, 'rb') as f:
+                return f.read(self.sample_size)
+        except OSError:
+            return b''
+
+
+    def get_skip_reason(self, relative_path: str, size: int, read_sample, root: str=None, tracked: bool=False) -> str:
+        """Get the reason a file is skipped, None if it is not
+
+        Keyword Arguments:
+        relative_path -- the path of the file inside its tree
+        size -- the size of the file in bytes
+        read_sample -- function returning the first bytes of the file, only called when needed
+        root -- the root of the tree, whose .gitignore and .gitattributes apply
+        tracked -- whether the files of the tree are tracked by git, so .gitignore does not apply
+        """
+        directories = relative_path.split('/')[:-1]
+        name = relative_path.split('/')[-1]
+
+        if any(directory in self.vendored_directories for directory in directories):
+            return 'vendored'
+        if any(fnmatch.fnmatch(name, pattern) for pattern in self.generated_patterns):
+            return 'generated'
+
+        ignored, attributes = self.get_rules(root, tracked=tracked)
+        if self.matches_rules(ignored, relative_path):
+            return 'gitignore'
+        if self.matches_rules(attributes.get('linguist-vendored', []), relative_path):
+            return 'vendored'
+        if self.matches_rules(attributes.get('linguist-generated', []), relative_path):
+            return 'generated'
+
+        if size > self.max_file_size:
+            return 'size'
+
+        sample = read_sample()[:self.sample_size]
+        if b'\0' in sample:
+            return 'binary'
+        if self.looks_minified(sample):
+            return 'minified'
+
+        return None
+
+
+    def looks_minified(self, sample: bytes) -> bool:
+        """Check if a sample of a file has a line longer than max_line_length"""
+        # A line cut short by the end of the sample only looks shorter than it is
+        return any(len(line) > self.max_line_length for line in sample.split(b'\n'))
+
+
+    def get_rules(self, root: str, read_tree_file=None, tracked: bool=False) -> (List[T], dict):
+        """Get the ignore rules and linguist attribute rules of the root of a tree
+
+        Rules are (pattern, matched) pairs, the last matching rule decides.
+        They are read once per root, from disk unless read_tree_file is given.
+        A file git tracks is extracted even if it matches the .gitignore, so
+        a tracked tree has no ignore rules.
+
+        Keyword Arguments:
+        root -- the root of the tree on disk, or the name of a tree read with read_tree_file
+        read_tree_file -- function returning the content of a file at the root of the tree, None if it has none
+        tracked -- whether the files of the tree are tracked by git
+        """
+        if root is None:
+            return [], {}
+
+        if root not in self.rules:
+            if read_tree_file is None:
+                read_tree_file = lambda filename: self.read_file(os.path.join(root, filename))
+
+            ignored = []
+            attributes = {}
+            if self.use_gitignore and not tracked:
+                for line in self.get_rule_lines(read_tree_file('.gitignore')):
+                    if line.startswith('!'):
+                        ignored.append((line[1:], False))
+                    else:
+                        ignored.append((line, True))
+
+            if self.use_gitattributes:
+                for line in self.get_rule_lines(read_tree_file('.gitattributes')):
+                    fields = line.split()
+                    for attribute in fields[1:]:
+                        value = not attribute.startswith(('-', '!')) and not attribute.endswith('=false')
+                        attribute = attribute.lstrip('-!').split('=')[0]
+                        if attribute in ('linguist-vendored', 'linguist-generated'):
+                            attributes.setdefault(attribute, []).append((fields[0], value))
+
+            self.rules[root] = (ignored, attributes)
+
+        return self.rules[root]
+
+
+    @staticmethod
+    def read_file(filename: str) -> bytes:
+        try:
+            with open(filename, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+    @staticmethod
+    def get_rule_lines(content: bytes) -> List[str]:
+        """Get the lines of a rule file that are neither blank nor comments"""
+        res = []
+        if content is None:
+            return res
+
+        for line in content.decode('utf-8', errors='replace').splitlines():
+            line = line.strip()
+            if line != '' and not line.startswith('#'):
+                res.append(line)
+
+        return res
+
+
+    @classmethod
+    def matches_rules(cls, rules: List[T], relative_path: str) -> bool:
+        matched = False
+        for pattern, value in rules:
+            if cls.matches_pattern(pattern, relative_path):
+                matched = value
+
+        return matched
+
+
+    @staticmethod
+    def matches_pattern(pattern: str, relative_path: str) -> bool:
+        """Check if a path matches a .gitignore style pattern
+
+        Keyword Arguments:
+        pattern -- the pattern, a trailing slash only matches directories
+        relative_path -- the path of the file relative to the root of the tree
+        """
+        parts = relative_path.split('/')
+        directory_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/').replace('**/', '*')
+
+        # A pattern matching a directory matches everything below it
+        candidates = ['/'.join(parts[:depth]) for depth in range(1, len(parts))]
+        if not directory_only:
+            candidates.append(relative_path)
+
+        for candidate in candidates:
+            if anchored:
+                if fnmatch.fnmatch(candidate, pattern):
+                    return True
+            elif fnmatch.fnmatch(candidate.split('/')[-1], pattern):
+                return True
+
+        return False
+
+
+    def summary(self) -> dict:
+        return {'kept_files': self.kept_files, 'kept_bytes': self.kept_bytes,
+                'skipped_files': dict(self.skipped_files), 'skipped_bytes': dict(self.skipped_bytes)}
@@ -0,0 +1,109 @@
+import functools
+from typing import TypeVar, List
+
+T = TypeVar("T")
+
+###############################################################################
+#   Nearest word of a vocabulary by edit distance, searched in a letter trie  #
+###############################################################################
+
+# Corrections of the most recent words, misspellings of a codebase repeating a lot
+CORRECTION_CACHE_SIZE = 100000
+
+# Key of a trie node holding the index of the word ending at it
+WORD_END = ''
+
+
+class spelling_corrector:
+    """Corrects words to the nearest word of a vocabulary starting with the same letter
+
+    The vocabulary is stored in a trie, one node per prefix. The edit distance
+    of a word to every prefix is computed one row of the Levenshtein table per
+    node, a row being derived from the row of the parent, so a prefix shared
+    by many words is compared once. A branch is left as soon as every cell of
+    its row is above the best distance found, which keeps a search with a
+    distance of 2 to a few thousand nodes out of the whole vocabulary.
+
+    Between words at the same distance the first of the vocabulary is chosen,
+    the result being the one of preprocess.correct_spelling scanning the
+    vocabulary with nltk edit_distance. A word no vocabulary word shares the
+    first letter of is not corrected, where the scan raised an IndexError.
+    """
+
+    def __init__(self, vocabulary: List[str], max_distance: int=2, cache_size: int=CORRECTION_CACHE_SIZE) -> None:
+        self.vocabulary = vocabulary
+        self.max_distance = max_distance
+        self.root = {}
+        for i, word in enumerate(vocabulary):
+            node = self.root
+            for char in word:
+                node = node.setdefault(char, {})
+            node.setdefault(WORD_END, i)
+
+        self.find_nearest = functools.lru_cache(maxsize=cache_size)(self.find_nearest)
+
+
+    def correct(self, word: str, min_word_size: int=1) -> (str, bool):
+        """Get the nearest word of the vocabulary and True, or the word and False if none is close enough
+
+        Keyword Arguments:
+        word -- the word to correct
+        min_word_size -- words of at most this many letters are not corrected
+        """
+        if len(word) > min_word_size:
+            nearest = self.find_nearest(word)
+            if nearest is not None:
+                return nearest[1], True
+
+        return word, False
+
+
+    def find_nearest(self, word: str) -> (int, str):
+        """Get the distance and the first word of the vocabulary sharing the first letter of a word at the smallest
+        edit distance of it, None if there is none within max_distance
+
+        Keyword Arguments:
+        word -- the word to look up
+        """
+        if word == '' or word[0] not in self.root:
+            return None
+
+        length = len(word)
+        # Every distance above max_distance is stored as max_distance + 1
+        far = self.max_distance + 1
+        best = self.max_distance
+        found = None
+
+        stack = [(self.root[word[0]], word[0], 1, [min(j, far) for j in range(length + 1)])]
+        while stack:
+            node, char, depth, previous = stack.pop()
+
+            row = [far] * (length + 1)
+            row[0] = min(depth, far)
+            # A cell further than max_distance from the diagonal is always above it
+            start = max(1, depth - self.max_distance)
+            end = min(length, depth + self.max_distance)
+            for j in range(start, end + 1):
+                distance = previous[j - 1] + (word[j - 1] != char)
+                if row[j - 1] + 1 < distance:
+                    distance = row[j - 1] + 1
+                if previous[j] + 1 < distance:
+                    distance = previous[j] + 1
+                row[j] = min(distance, far)
+
+            if min(row[start - 1:end + 1]) > best:
+                continue
+
+            if WORD_END in node and row[length] <= best:
+                index = node[WORD_END]
+                if found is None or row[length] < best or index < found:
+                    best, found = row[length], index
+
+            for next_char, child in node.items():
+                if next_char != WORD_END:
+                    stack.append((child, next_char, depth + 1, row))
+
+        if found is None:
+            return None
+
+        return best, self.vocabulary[found]
@@ -14,6 +14,7 @@ import redis
 from redis import Redis
 from flask import render_template, Blueprint, jsonify, request, Response, send_file, redirect, url_for
 from celery.result import AsyncResult
+from werkzeug.utils import secure_filename
 from project.server.tasks import create_task
 from project.machine_learning import app as machine_learning
 main_blueprint = Blueprint("main", __name__) #, static_folder='static')
@@ -33,6 +34,17 @@ def store_data(request, column: str):
     return column
 
 
+def store_archive(file) -> str:
+    rand_alphabet = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'z', 'x', 'w', '1','2','3','4','5','6','7','8','9', '0']
+
+    data_key = "archive-"
+    for i in range(random.randint(4, 7)):
+        data_key += random.choice(rand_alphabet)
+
+    machine_learning.archive_store.set(data_key, zlib.compress(file.read()), ex=machine_learning.archive_ttl)
+    return data_key
+
+
 @main_blueprint.route('/label', methods=["GET", "POST"])
 def label():
 
@@ -166,6 +178,23 @@ def run_task():
         task = create_task.delay(info)
         print(task.id)
         return jsonify({"task_id": task.id}), 200
+    if type == 'archive':
+        file = request.files.get('file')
+        if file is None or file.filename == '':
+            return jsonify({"error": "no archive file was uploaded"}), 400
+        data_key = store_archive(file)
+        info = {'type': type, 'file': data_key, 'filename': secure_filename(file.filename) }
+        task = create_task.delay(info)
+        print(task.id)
+        return jsonify({"task_id": task.id}), 200
+    if type == 'path':
+        path = request.form.get('path')
+        if machine_learning.resolve_ingest_path(path) is None:
+            return jsonify({"error": "path must be a directory under INGEST_ROOT"}), 403
+        info = {'type': type, 'path': path }
+        task = create_task.delay(info)
+        print(task.id)
+        return jsonify({"task_id": task.id}), 200
 
 
 
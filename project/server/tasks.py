@@ -10,6 +10,7 @@ from project.machine_learning import app as machine_learning
 celery = Celery(__name__)
 celery.conf.broker_url = os.environ['REDIS_URL']
 celery.conf.result_backend = os.environ['REDIS_URL']
+celery.conf.worker_concurrency = machine_learning.worker_concurrency
 
 
 @celery.task(name="create_task")
@@ -25,4 +26,13 @@ def create_task(info):
         branch = info['branch']
         result = machine_learning.repo(repo_url, branch)
         return result, 200
+    if type == 'archive':
+        file = info['file']
+        filename = info['filename']
+        result = machine_learning.archive(file, filename)
+        return result, 200
+    if type == 'path':
+        path = info['path']
+        result = machine_learning.local(path)
+        return result, 200
 
@@ -1,11 +1,104 @@
+import os
+import random
+import re
+import string
+
+import git
 import pytest
 
+from project.machine_learning.src import preprocessor
+from project.machine_learning.src.preprocessor import preprocess
 from project.server import create_app
 
 
+WORD_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "word.pkl")
+
+STOPWORDS = ['i', 'me', 'my', 'we', 'our', 'you', 'he', 'she', 'it', 'its', 'they', 'what', 'which', 'this', 'that',
+             'is', 'are', 'was', 'be', 'been', 'have', 'has', 'do', 'does', 'a', 'an', 'the', 'and', 'but', 'if',
+             'or', 'because', 'as', 'until', 'while', 'of', 'at', 'by', 'for', 'with', 'to', 'from', 'in', 'out',
+             'on', 'off', 'again', 'then', 'once', 'here', 'there', 'all', 'no', 'not', 'only', 'so', 'than',
+             'too', 'very', 's', 't', 'can', 'will', 'just', 'should', 'now']
+
+DICTIONARY = ['user', 'data', 'check', 'value', 'file', 'name', 'read', 'write', 'buffer', 'privacy', 'safe', 'secure',
+              'password', 'token', 'number', 'return', 'make', 'sure', 'never', 'store', 'plain', 'text', 'respect',
+              'people', 'access', 'control', 'list', 'cache', 'entry', 'remove', 'later']
+
+COMMENTS = [
+    "TODO: make sure we never store the user's password in plain text!",
+    "Returns the value (or None) of key_name; see https://example.com/docs?id=42",
+    "fixme -- respect user privacy & autonomy; 3 retries max",
+    "/* checkUserAccess() controls who can read the data */",
+    "@param passwordtoken the buffer to write, e.g. \"abc\" [deprecated]",
+    "This isn't the safest thing: it's 100% unsafe... Don't do it.",
+    "usersafetycheck readbuffervalue plaintextpassword",
+    "",
+    "   ",
+    "a " * 60,
+    "word " * 120,
+]
+
+
+class fake_stopwords:
+    @staticmethod
+    def words(language):
+        return list(STOPWORDS)
+
+
+def simple_tokenise(sentence):
+    return re.findall(r"\w+|[^\w\s]+", sentence)
+
+
+def random_comments(count, seed=0):
+    rand = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + string.punctuation + "  éü\t"
+    words = DICTIONARY + STOPWORDS
+    for i in range(count):
+        parts = [rand.choice(words) if rand.random() < 0.6 else
+                 "".join(rand.choice(alphabet) for j in range(rand.randint(1, 12))) for k in range(rand.randint(0, 30))]
+        yield " ".join(parts)
+
+
 @pytest.fixture(scope="module")
 def test_app():
     app = create_app()
     app.config.from_object("project.server.config.TestingConfig")
     with app.app_context():
         yield app  # testing happens here
+
+
+@pytest.fixture
+def machine_learning(test_app):
+    """The labeling app, imported once the server is created since it loads the models"""
+    from project.machine_learning import app
+    return app
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    """A preprocess of the words of DICTIONARY, with stand-ins for the NLTK stopwords and tokeniser"""
+    monkeypatch.setattr(preprocessor, "sw", fake_stopwords)
+    monkeypatch.setattr(preprocessor.nltk, "word_tokenize", simple_tokenise)
+    preprocessor.get_english_stopwords.cache_clear()
+    processor = preprocess()
+    processor.correct_words = list(DICTIONARY)
+    yield processor
+    preprocessor.get_english_stopwords.cache_clear()
+
+
+@pytest.fixture
+def init_git_repo():
+    """Factory creating a git repository on branch main, with a committer and filtered fetches allowed"""
+    repos = []
+
+    def init(directory):
+        git_repo = git.Repo.init(str(directory), initial_branch="main")
+        with git_repo.config_writer() as config:
+            config.set_value("user", "name", "fixture author")
+            config.set_value("user", "email", "fixture@example.com")
+            config.set_value("uploadpack", "allowFilter", "true")
+        repos.append(git_repo)
+        return git_repo
+
+    yield init
+    for git_repo in repos:
+        git_repo.close()
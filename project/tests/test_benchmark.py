@@ -0,0 +1,39 @@
+import os
+
+from project.machine_learning.src import benchmark
+from project.machine_learning.src import extractor
+
+
+def read_tree(directory):
+    res = {}
+    for root, directories, files in os.walk(directory):
+        for file in files:
+            with open(os.path.join(root, file)) as f:
+                res[os.path.relpath(os.path.join(root, file), directory)] = f.read()
+    return res
+
+
+def test_generate_corpus_is_deterministic(tmp_path):
+    first = benchmark.generate_corpus(str(tmp_path / "first"), files_per_size=1, file_lines=(30,))
+    benchmark.generate_corpus(str(tmp_path / "second"), files_per_size=1, file_lines=(30,))
+
+    assert set(first) == set(extractor.languages)
+    assert read_tree(str(tmp_path / "first")) == read_tree(str(tmp_path / "second"))
+
+
+def test_generated_sources_contain_comments(tmp_path):
+    corpus = benchmark.generate_corpus(str(tmp_path), files_per_size=1, file_lines=(50,), densities=(0.5,))
+
+    for key, files in corpus.items():
+        assert extractor.extract_all_comment_from_file(files[0], extractor.languages[key]) != [], key
+
+
+def test_run_benchmark_reports_every_language(tmp_path):
+    report = benchmark.run_benchmark(str(tmp_path), repeat=1, files_per_size=1, file_lines=(10,), densities=(0.5,))
+
+    assert set(report['results']) == set(extractor.languages)
+    rates = report['results']['python']['extract_all_comment_from_file']
+    assert rates['files'] == 1
+    assert 'peak_rss' not in rates
+    assert report['process_peak_rss'] > 0
+    assert set(benchmark.compare_benchmarks(report, report)['python'].values()) == {1.0}
@@ -0,0 +1,104 @@
+import os
+
+import git
+import pytest
+
+from project.machine_learning.src import extractor
+from project.machine_learning.src import clone_pool as clone_pool_module
+from project.machine_learning.src.clone_pool import clone_pool
+
+
+def commit_file(git_repo, name, content):
+    with open(os.path.join(git_repo.working_tree_dir, name), "w") as f:
+        f.write(content)
+    git_repo.index.add([name])
+    git_repo.index.commit("add " + name)
+
+
+@pytest.fixture
+def origin(init_git_repo, tmp_path):
+    git_repo = init_git_repo(tmp_path / "origin")
+    commit_file(git_repo, "a.py", "# first comment\n")
+    return git_repo
+
+
+def test_checkout_fetches_into_existing_clone(origin, tmp_path):
+    pool = clone_pool(str(tmp_path / "pool"))
+    url = "file://" + origin.working_tree_dir
+
+    with pool.checkout(url, "main") as location:
+        assert os.listdir(location).count("a.py") == 1
+
+    commit_file(origin, "b.py", "# second comment\n")
+    with pool.checkout(url, "main") as second_location:
+        assert second_location == location
+        assert os.path.isfile(os.path.join(location, "b.py"))
+
+    assert (pool.clones, pool.fetches) == (1, 1)
+
+
+def test_evict_removes_least_recently_used_clone(origin, tmp_path):
+    pool = clone_pool(str(tmp_path / "pool"))
+    url = "file://" + origin.working_tree_dir
+
+    with pool.checkout(url, "main") as checkout_location:
+        pass
+    with pool.checkout(url, "main", bare=True) as bare_location:
+        pass
+
+    pool.max_bytes = pool.get_entries()[-1][1]
+    assert pool.evict() == 1
+    assert not os.path.exists(checkout_location)
+    assert os.path.isdir(bare_location)
+
+
+def test_evict_skips_clones_in_use(origin, tmp_path):
+    pool = clone_pool(str(tmp_path / "pool"), max_bytes=0)
+    url = "file://" + origin.working_tree_dir
+
+    with pool.checkout(url, "main") as location:
+        assert pool.evict() == 0
+        assert os.path.isdir(location)
+
+    assert not os.path.exists(location)
+
+
+def test_checkout_prepares_clone_evicted_before_it_is_read(origin, tmp_path, monkeypatch):
+    pool = clone_pool(str(tmp_path / "pool"), max_bytes=0)
+    url = "file://" + origin.working_tree_dir
+    flock = clone_pool_module.fcntl.flock
+    evicted = []
+
+    def flock_then_evict(lock, operation):
+        # Another job evicts the clone between the exclusive and the shared lock
+        if operation == clone_pool_module.fcntl.LOCK_SH and not evicted:
+            flock(lock, clone_pool_module.fcntl.LOCK_UN)
+            evicted.append(pool.evict())
+        flock(lock, operation)
+
+    monkeypatch.setattr(clone_pool_module.fcntl, "flock", flock_then_evict)
+    with pool.checkout(url, "main") as location:
+        assert os.path.isfile(os.path.join(location, "a.py"))
+
+    assert evicted == [1]
+    assert pool.clones == 2
+
+def test_failed_clone_leaves_nothing_behind(tmp_path):
+    pool = clone_pool(str(tmp_path / "pool"))
+
+    with pytest.raises(git.exc.GitCommandError):
+        with pool.checkout("file://" + str(tmp_path / "missing"), "main"):
+            pass
+
+    assert pool.get_entries() == []
+    assert [name for name in os.listdir(pool.directory) if not name.endswith(".lock")] == []
+
+
+def test_repo_extraction_removes_temporary_clone(origin, monkeypatch, tmp_path):
+    monkeypatch.setattr(extractor.tempfile, "tempdir", str(tmp_path))
+    before = set(os.listdir(tmp_path))
+
+    comments = list(extractor.iter_comment_from_repo("file://" + origin.working_tree_dir, "main"))
+
+    assert [record['line'] for record in comments[0]] == ["first comment "]
+    assert set(os.listdir(tmp_path)) == before
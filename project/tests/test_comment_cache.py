@@ -0,0 +1,98 @@
+import time
+import sqlite3
+
+from project.machine_learning.src import extractor
+from project.machine_learning.src.comment_cache import comment_cache
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = comment_cache(str(tmp_path / "cache.db"), max_entries=2)
+    cache.put("first", [["a", ""]])
+    time.sleep(0.01)
+    cache.put("second", [["b", ""]])
+    time.sleep(0.01)
+    cache.get("first")
+    time.sleep(0.01)
+    cache.put("third", [["c", ""]])
+
+    assert cache.evict() == 1
+    assert cache.get("second") is None
+    assert cache.get("first") == [["a", ""]]
+    assert cache.get("third") == [["c", ""]]
+    cache.close()
+
+
+def test_cached_extraction_reuses_identical_blobs(tmp_path):
+    source = "# shared comment\nx = 1\n"
+    files = []
+    for name in ("a.py", "b.py"):
+        path = tmp_path / name
+        path.write_text(source)
+        files.append(str(path))
+    languages = [extractor.python_comment] * len(files)
+    expected = [extractor.extract_all_comment_from_file(file, extractor.python_comment) for file in files]
+
+    cache = comment_cache(str(tmp_path / "cache.db"))
+    first = list(extractor.map_cached_comment_extraction(extractor.extract_all_comment_from_file, files, languages, cache))
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    second = list(extractor.map_cached_comment_extraction(extractor.extract_all_comment_from_file, files, languages, cache))
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+    assert first == expected
+    assert second == expected
+
+
+def test_caches_sharing_a_database_do_not_lock_each_other(tmp_path):
+    database = str(tmp_path / "cache.db")
+    first = comment_cache(database, timeout=0.1)
+    first.put("a", [["a", ""]])
+    first.commit()
+    assert first.get("a") == [["a", ""]]
+    first.put("b", [["b", ""]])
+
+    # The first job is still running, its hit and its new entry are not written yet
+    second = comment_cache(database, timeout=0.1)
+    assert second.get("a") == [["a", ""]]
+    second.put("c", [["c", ""]])
+    second.commit()
+    assert second.get("c") == [["c", ""]]
+    second.close()
+
+    first.close()
+    assert comment_cache(database).get("b") == [["b", ""]]
+
+
+def test_locked_database_is_a_cache_miss(tmp_path):
+    database = str(tmp_path / "cache.db")
+    cache = comment_cache(database, timeout=0.1, batch_size=1)
+    cache.put("a", [["a", ""]])
+
+    locker = sqlite3.connect(database)
+    locker.execute("begin exclusive")
+    assert cache.get("a") is None
+    assert cache.misses == 1
+    cache.put("b", [["b", ""]])
+    locker.rollback()
+    locker.close()
+
+    assert cache.get("a") == [["a", ""]]
+    assert cache.get("b") is None
+    cache.close()
+
+
+def test_commit_evicts_above_max_entries(tmp_path):
+    database = str(tmp_path / "cache.db")
+    cache = comment_cache(database, max_entries=2, batch_size=2)
+    for key in ["a", "b", "c", "d", "e"]:
+        cache.put(key, [[key, ""]])
+        time.sleep(0.01)
+    cache.commit()
+
+    # The worker keeps the cache open, it does not grow past max_entries until it is closed
+    count = sqlite3.connect(database).execute("select count(*) from comment_cache").fetchone()[0]
+    assert count == 2
+    assert cache.get("e") == [["e", ""]]
+    assert cache.get("a") is None
+    cache.close()
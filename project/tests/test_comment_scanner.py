@@ -0,0 +1,71 @@
+import contextlib
+import io
+import random
+
+import pytest
+
+from project.machine_learning.src import extractor
+from project.machine_learning.src.comment_scanner import comment_scanner
+
+
+GOLDEN_SOURCES = [
+    '# hello world\n# second line\nx = 1\n"""doc string here"""\n',
+    '"""\nmultiline python\ndocstring\n"""\ndef f():\n    return 1  # trailing comment\n',
+    '// c comment\nint x; /* block */\n/*\n * spanning\n * lines\n */\n',
+    '\\/\\* escaped delimiters \\*\\/\n\\/\\/ escaped single line\n',
+    '=begin\nruby block\n=end\n# ruby comment\n',
+    '<!-- html comment -->\n<p>text</p>\n<!--\nspanning\n-->\n',
+    ':: batch comment\necho hi\n:: another\n:: one\n',
+    '; assembly comment\nmov ax, bx ; trailing\n',
+    '=pod\nperl = docs\n=cut\n# perl comment\n',
+    '',
+    '\n\n\n',
+    '#\n##\n# #\n',
+]
+
+
+def reference_comments(lines, language):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return extractor.extract_comment_from_line_list(lines, language)
+
+
+def to_lines(source, filename="golden.src"):
+    return [{'line': line, 'location': filename + ": " + str(line_number + 1)}
+            for line_number, line in enumerate(source.splitlines())]
+
+
+@pytest.mark.parametrize("key", list(extractor.languages))
+@pytest.mark.parametrize("source", GOLDEN_SOURCES)
+def test_scanner_matches_line_list_extraction(key, source):
+    language = extractor.languages[key]
+    lines = to_lines(source)
+
+    assert comment_scanner(language).scan(lines) == reference_comments(lines, language)
+
+
+@pytest.mark.parametrize("key", list(extractor.languages))
+def test_scanner_matches_line_list_extraction_on_random_lines(key):
+    language = extractor.languages[key]
+    scanner = comment_scanner(language)
+    generator = random.Random(key)
+    alphabet = list('ab #/*"=<>-!:;\\▓\t') + \
+        ['//', '/*', '*/', '"""', '<!--', '-->', '::', '=begin', '=end', ' word ']
+
+    for _ in range(300):
+        lines = [''.join(generator.choice(alphabet) for _ in range(generator.randint(0, 14)))
+                 for _ in range(generator.randint(0, 8))]
+        lines = to_lines("\n".join(lines))
+
+        assert scanner.scan(lines) == reference_comments(lines, language)
+
+
+@pytest.mark.parametrize("source", GOLDEN_SOURCES)
+def test_scan_buffer_matches_file_lines(source, tmp_path):
+    path = tmp_path / "golden.py"
+    path.write_text(source)
+    scanner = extractor.get_scanner(extractor.python_comment)
+
+    lines = extractor.get_every_line_from_file(str(path))
+
+    assert scanner.scan_buffer(source, str(path)) == scanner.scan(lines)
+    assert extractor.extract_comment_from_file_lines(str(path), extractor.python_comment) == scanner.scan(lines)
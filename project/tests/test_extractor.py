@@ -0,0 +1,326 @@
+import io
+import linecache
+import os
+import re
+import tarfile
+import zipfile
+
+import pandas as pd
+import pytest
+
+from project.machine_learning.src import benchmark
+from project.machine_learning.src import extractor
+from project.machine_learning.src.comment_cache import comment_cache
+from project.machine_learning.src.csv_file_modifier.modifier import csv_modifier
+from project.machine_learning.src.source_filter import source_filter
+
+
+SOURCES = {
+    "a.py": '# hello world\n# second line\nx = 1\n"""doc string here"""\n',
+    "sub/b.c": "// c comment\nint x; /* block */\n",
+    "sub/c.js": "function(){} // js thing\n",
+    "sub/deeper/d.rb": "# ruby comment\n=begin\nruby block\n=end\n",
+}
+
+
+@pytest.fixture
+def source_tree(tmp_path):
+    for name, content in SOURCES.items():
+        path = tmp_path / "tree" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return str(tmp_path / "tree")
+
+
+def read_comment_files(files):
+    return pd.concat([pd.read_csv(file) for file in files]).reset_index(drop=True)
+
+
+def test_snapshot_matches_per_language_extraction(source_tree, tmp_path):
+    single = tmp_path / "single"
+    single.mkdir()
+    per_language = tmp_path / "per_language"
+    per_language.mkdir()
+
+    files = extractor.get_comment_from_path_using_all_languages(source_tree, str(single))
+
+    for key in extractor.languages:
+        extractor.extract_comment_from_path(source_tree, extractor.languages[key], str(per_language))
+
+    expected = read_comment_files(sorted(str(path) for path in per_language.iterdir()))
+    result = read_comment_files(files)
+
+    sort_by = ['language', 'location', 'line']
+    pd.testing.assert_frame_equal(
+        result.sort_values(sort_by).reset_index(drop=True),
+        expected.sort_values(sort_by).reset_index(drop=True))
+
+
+def test_get_language_from_file():
+    assert extractor.get_language_from_file("main.py") is extractor.python_comment
+    assert extractor.get_language_from_file("archive.tar.c") is extractor.c_comment
+    assert extractor.get_language_from_file("README") is None
+
+
+def test_get_every_singleline_groups_consecutive_comments(tmp_path):
+    path = tmp_path / "grouped.py"
+    path.write_text("# first\n# still first\nx = 1\n# second\n#\ny = 2 # third\nz = 3 # unterminated")
+
+    comments = extractor.get_every_singleline(str(path), extractor.python_comment)
+
+    assert [comment['line'] for comment in comments] == ["first still first ", "second ", "third "]
+    assert {comment['location'] for comment in comments} == {str(path)}
+
+
+
+def legacy_singleline(filename, language):
+    """get_every_singleline as it was before it streamed the file, looking every line up through linecache"""
+    linecache.clearcache()
+    res = []
+    count = 0
+    prev = False
+    for i in range(csv_modifier().get_number_of_lines_in_file(filename)):
+        b = re.findall("(?<=" + language['single_line'][0] + ").+?[\n\r]", linecache.getline(filename, i))
+        if b != [] and b[0].strip() != '':
+            prev = True
+            if len(res) <= count:
+                res.append("")
+            res[count] += b[0].strip() + " "
+        elif b == []:
+            if prev:
+                count += 1
+            prev = False
+    return res
+
+
+@pytest.mark.parametrize("content", [
+    b"x = 1\n# first\n# last line without newline",
+    b"# first\n# second\nx = 1 # third\n",
+    b"# only line without newline",
+    b"# first\r\n# second\r\nx = 1\r\n# last",
+    b"# first\n\n# second\n#\n",
+])
+def test_get_every_singleline_matches_linecache_grouping(tmp_path, content):
+    path = tmp_path / "grouped.py"
+    path.write_bytes(content)
+    expected = legacy_singleline(str(path), extractor.python_comment)
+
+    assert [c['line'] for c in extractor.get_every_singleline(str(path), extractor.python_comment)] == expected
+    singleline = extractor.extract_all_comment_from_file(str(path), extractor.python_comment)
+    assert [c['line'] for c in singleline] == expected
+
+
+def test_last_line_comment_without_newline_is_not_extracted(tmp_path):
+    path = tmp_path / "unterminated.py"
+    path.write_text("x = 1\n# kept\ny = 2\n# dropped as before, no line ending follows it")
+
+    comments = extractor.get_every_singleline(str(path), extractor.python_comment)
+    assert [comment['line'] for comment in comments] == ["kept "]
+
+
+def test_get_every_singleline_reads_carriage_return_line_endings(tmp_path):
+    path = tmp_path / "mac.py"
+    path.write_bytes(b"# first\r# second\rx = 1\r# third\r")
+
+    # linecache counted lines by their \n, and found a single empty line in such a file
+    assert legacy_singleline(str(path), extractor.python_comment) == []
+    comments = extractor.get_every_singleline(str(path), extractor.python_comment)
+    assert [comment['line'] for comment in comments] == ["first second ", "third "]
+
+def test_parallel_extraction_matches_serial(source_tree, tmp_path):
+    serial = tmp_path / "serial"
+    serial.mkdir()
+    parallel = tmp_path / "parallel"
+    parallel.mkdir()
+
+    expected = extractor.get_comment_from_path_using_all_languages(source_tree, str(serial))
+    result = extractor.get_comment_from_path_using_all_languages(source_tree, str(parallel), workers=2)
+
+    pd.testing.assert_frame_equal(read_comment_files(result), read_comment_files(expected))
+
+
+def test_iter_comment_from_snapshot_matches_comment_files(source_tree, tmp_path):
+    files = extractor.get_comment_from_path_using_all_languages(source_tree, str(tmp_path))
+
+    comments = extractor.iter_comment_from_snapshot(source_tree, extractor.extract_comment_from_file_lines)
+    records = [comment for comments_in_file in comments for comment in comments_in_file]
+
+    expected = read_comment_files(files)
+    expected = list(expected[['line', 'location', 'language']].itertuples(index=False, name=None))
+    result = [(record['line'], record['location'], record['language']) for record in records]
+    assert sorted(result) == sorted(expected)
+
+
+def test_detect_encoding_prefers_utf8_and_caches_fallback():
+    assert extractor.detect_encoding("# naïve comment\n".encode('utf-8')) == 'utf-8'
+    assert extractor.detect_encoding(b"\xef\xbb\xbf# bom\n") == 'utf-8-sig'
+
+    data = ("# commentaire accentué, très déjà vu\n" * 20).encode('latin-1')
+    encoding = extractor.detect_encoding(data)
+    assert data.decode(encoding) == ("# commentaire accentué, très déjà vu\n" * 20)
+    assert extractor.detected_encodings[extractor.git_blob_sha(data)] == encoding
+
+
+def test_undetected_encoding_is_decoded_with_replacement_characters(tmp_path):
+    data = b"# \x81\x8d\x8f\x90\x9d\nx = 1\n"
+    assert extractor.detect_encoding(data) is None
+    path = tmp_path / "undetected.py"
+    path.write_bytes(data)
+
+    assert extractor.decode_file_content(data, str(path)) == data.decode('utf-8', errors='replace')
+    for comments in (extractor.extract_all_comment_from_file(str(path), extractor.python_comment),
+                     extractor.extract_all_comment_from_content(data, str(path), extractor.python_comment)):
+        assert len(comments) == 1
+        assert "\ufffd" * 5 in comments[0]['line']
+
+
+@pytest.mark.parametrize("content", [
+    "# commentaire accentué, très déjà vu\nx = 1\n\"\"\"chaîne\nà la ligne\"\"\"\n" * 3,
+    "\ufeff# naïve comment\r\n# ça continue\r\n\"\"\"doc\r\nstring\"\"\"\r\n",
+])
+@pytest.mark.parametrize("encoding", ["utf-8", "latin-1"])
+def test_file_and_content_extraction_decode_alike(tmp_path, content, encoding):
+    data = content.encode(encoding, errors='ignore')
+    path = tmp_path / "encoded.py"
+    path.write_bytes(data)
+
+    from_file = extractor.extract_all_comment_from_file(str(path), extractor.python_comment)
+    from_content = extractor.extract_all_comment_from_content(data, str(path), extractor.python_comment)
+    assert from_file == from_content
+    assert len(from_file) >= 2
+    assert not any('\ufffd' in comment['line'] for comment in from_file)
+
+def test_get_every_line_from_file_translates_newlines(tmp_path):
+    path = tmp_path / "newlines.py"
+    path.write_bytes(b"first\r\nsecond\rthird\n")
+
+    lines = extractor.get_every_line_from_file(str(path))
+
+    assert [line['line'] for line in lines] == ["first", "second", "third"]
+    assert lines[-1]['location'] == str(path) + ": 3"
+
+
+def build_archive(kind):
+    buffer = io.BytesIO()
+    if kind == "zip":
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for name, content in SOURCES.items():
+                archive.writestr(name, content)
+    else:
+        with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+            for name, content in SOURCES.items():
+                data = content.encode('utf-8')
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.mark.parametrize("kind", ["zip", "tar.gz"])
+def test_iter_comment_from_archive_matches_files(source_tree, kind):
+    comments = extractor.iter_comment_from_archive(build_archive(kind), "src." + kind)
+    result = sorted((record['line'], record['location'], record['language'])
+                    for comments_in_file in comments for record in comments_in_file)
+
+    expected = []
+    for name in SOURCES:
+        path = os.path.join(source_tree, name)
+        for record in extractor.extract_all_comment_from_file(path, extractor.get_language_from_file(name)):
+            location = record['location'].replace(source_tree, "src." + kind, 1)
+            expected.append((record['line'], location, record['language']))
+
+    assert result == sorted(expected)
+
+
+def test_iter_comment_from_local_reads_directories_and_archives(source_tree, tmp_path):
+    archive = tmp_path / "src.zip"
+    archive.write_bytes(build_archive("zip").getvalue())
+
+    from_directory = [record['line'] for comments in extractor.iter_comment_from_local(source_tree) for record in comments]
+    from_archive = [record['line'] for comments in extractor.iter_comment_from_local(str(archive)) for record in comments]
+
+    assert sorted(from_directory) == sorted(from_archive)
+
+
+@pytest.fixture
+def fixture_repo(init_git_repo, source_tree):
+    git_repo = init_git_repo(source_tree)
+    with open(os.path.join(source_tree, "big.py"), "w") as f:
+        f.write("# big comment\n" * 100)
+    git_repo.git.add(A=True)
+    git_repo.index.commit("fixture")
+    return "file://" + source_tree
+
+
+def test_bare_repo_extraction_matches_checkout(fixture_repo, source_tree):
+    comments = extractor.iter_comment_from_repo(fixture_repo, "main", bare=True)
+    result = sorted((record['line'], record['location'], record['language'])
+                    for comments_in_file in comments for record in comments_in_file)
+
+    expected = []
+    for name in list(SOURCES) + ["big.py"]:
+        path = os.path.join(source_tree, name)
+        for record in extractor.extract_all_comment_from_file(path, extractor.get_language_from_file(name)):
+            expected.append((record['line'], record['location'].replace(source_tree, fixture_repo, 1), record['language']))
+
+    assert result == sorted(expected)
+
+
+def test_bare_repo_extraction_skips_blobs_left_out_of_partial_clone(fixture_repo, tmp_path):
+    file_filter = source_filter()
+    cache = comment_cache(str(tmp_path / "cache.db"))
+
+    comments = list(extractor.iter_comment_from_repo(fixture_repo, "main", cache=cache, file_filter=file_filter,
+                                                     bare=True, blob_limit=1000))
+    assert not any(record['location'].endswith("big.py") for comments_in_file in comments for record in comments_in_file)
+    assert file_filter.skipped_files['size'] == 1
+
+    cached = list(extractor.iter_comment_from_repo(fixture_repo, "main", cache=cache, bare=True, blob_limit=1000))
+    assert cache.hits == len(SOURCES)
+    assert cached == comments
+    cache.close()
+
+
+def test_bare_repo_extraction_reads_rules_from_the_tree(init_git_repo, source_tree):
+    with open(os.path.join(source_tree, ".gitattributes"), "w") as f:
+        f.write("sub/deeper/** linguist-vendored\n*.js linguist-generated\n")
+    git_repo = init_git_repo(source_tree)
+    git_repo.git.add(A=True)
+    git_repo.index.commit("fixture")
+
+    file_filter = source_filter()
+    comments = list(extractor.iter_comment_from_repo("file://" + source_tree, "main", file_filter=file_filter, bare=True))
+    locations = {record['location'] for comments_in_file in comments for record in comments_in_file}
+    assert not any(location.endswith(("d.rb", "c.js")) for location in locations)
+    assert file_filter.skipped_files == {'vendored': 1, 'generated': 1}
+
+def legacy_multiline(text, language):
+    raw_multiline = re.findall(language["multiline_start"] + ".*?" + language["multiline_end"], text, flags=re.DOTALL)
+    for item in language['strip']:
+        raw_multiline = [re.sub(item, ' ', s) for s in raw_multiline]
+    c = [re.sub('\n', ' ', s) for s in raw_multiline]
+    c = [re.sub(r'\s+', ' ', s) for s in c]
+    return [s.strip() for s in c]
+
+
+def test_mmap_multiline_matches_legacy_extraction(tmp_path):
+    corpus = benchmark.generate_corpus(str(tmp_path), files_per_size=1, file_lines=(300,), densities=(0.3,))
+    edge_cases = ["", "/* unterminated", "/*\r\n * crlf\r\n */", "/* nbsp\xa0sep\u2028 */ <!-- a -- b! --> \"\"\"x\"\"\"",
+                  "=begin\n  ruby =end text\n=end", "/* naïve ünïcode */"]
+
+    for key, files in corpus.items():
+        language = extractor.languages[key]
+        if 'strip' not in language:
+            assert extractor.get_every_multiline(files[0], language) == []
+            continue
+
+        for index, content in enumerate(edge_cases):
+            path = tmp_path / ("edge%d.%s" % (index, language['format']))
+            path.write_bytes(content.encode('utf-8'))
+            files.append(str(path))
+
+        for file in files:
+            with open(file, encoding='utf-8') as f:
+                expected = legacy_multiline(f.read(), language)
+            assert [comment['line'] for comment in extractor.get_every_multiline(file, language)] == expected, file
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from project.machine_learning.src import extractor
+
+
+def commit_files(git_repo, files, message):
+    for name, content in files.items():
+        path = os.path.join(git_repo.working_tree_dir, name)
+        if content is None:
+            git_repo.index.remove([name], working_tree=True)
+            continue
+        with open(path, "w") as f:
+            f.write(content)
+        git_repo.index.add([name])
+    return git_repo.index.commit(message)
+
+
+@pytest.fixture
+def history_repo(init_git_repo, tmp_path):
+    git_repo = init_git_repo(tmp_path / "history")
+    commits = [
+        commit_files(git_repo, {"a.py": "# keep users safe\nx = 1\n", "notes.txt": "# not code\n"}, "first"),
+        commit_files(git_repo, {"a.py": "x = 1\n# keep users safe\n/* */\ny = 2 # respect privacy\n"}, "move"),
+        commit_files(git_repo, {"a.py": "x = 1\n# keep users safe\n/* */\ny = 2 # respect autonomy\n",
+                                "b.c": "int x; /* block\n   comment */\n"}, "change"),
+        commit_files(git_repo, {"b.c": None}, "delete"),
+    ]
+    return git_repo, commits
+
+
+def get_changes(comments_per_file):
+    return [(comment['change'], comment['line'].strip(), comment['location'].split("/")[-1], comment['commit'])
+            for comments in comments_per_file for comment in comments]
+
+
+def test_history_emits_added_and_removed_comments(history_repo):
+    git_repo, commits = history_repo
+    first, move, change, delete = [commit.hexsha for commit in commits]
+
+    comments = list(extractor.iter_comment_from_commits(git_repo.working_tree_dir, "main", "repo"))
+
+    assert get_changes(comments) == [
+        ('added', 'keep users safe', 'a.py: 1', first),
+        ('added', 'respect privacy', 'a.py: 4', move),
+        ('removed', 'respect privacy', 'a.py: 4', change),
+        ('added', 'respect autonomy', 'a.py: 4', change),
+        ('added', 'block', 'b.c: 1', change),
+        ('removed', 'block', 'b.c: 1', delete),
+    ]
+    assert comments[0][0]['author'] == "fixture author"
+    assert comments[0][0]['date'] == commits[0].authored_datetime.isoformat()
+
+
+def test_history_walks_a_range_of_commits(history_repo):
+    git_repo, commits = history_repo
+
+    ranged = get_changes(extractor.iter_comment_from_commits(git_repo.working_tree_dir, commits[1].hexsha + "..main"))
+    latest = get_changes(extractor.iter_comment_from_commits(git_repo.working_tree_dir, "main", max_count=2))
+
+    assert {commit for change, line, location, commit in ranged} == {commits[2].hexsha, commits[3].hexsha}
+    assert latest == ranged
+
+
+def test_history_file_from_cloned_repo(history_repo, tmp_path):
+    git_repo, commits = history_repo
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+
+    filename = extractor.get_comment_history_from_repo("file://" + git_repo.working_tree_dir, "main", str(output_dir))
+
+    with open(filename) as f:
+        rows = f.read().splitlines()
+    assert rows[0] == ",".join(extractor.HISTORY_FIELDNAMES)
+    assert len(rows) == 7
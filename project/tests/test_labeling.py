@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from project.machine_learning.src.parallel_preprocessor import parallel_preprocessor
+from project.tests.conftest import DICTIONARY
+
+
+def comment(line, location, language='python'):
+    return {'line': line, 'location': location, 'language': language}
+
+
+# Repeated lines, repeated locations, and the same line or location in another language
+COMMENTS_PER_FILE = [
+    [comment("never store the password", "a.py"), comment("read the user data", "a.py"),
+     comment("check the token", "a.py: 3")],
+    [],
+    [comment("never store the password", "b.py"), comment("never store the password", "b.c", 'c'),
+     comment("write the buffer", "b.c", 'c'), comment("remove the entry", "b.c", 'c')],
+    [comment("read the user data", "c.py"), comment("make sure", "a.py"), comment("plain text", "d.py"),
+     comment("plain text", "d.py")],
+]
+
+
+def test_iter_unique_comments_matches_drop_duplicates(machine_learning):
+    data = pd.DataFrame.from_records([c for comments in COMMENTS_PER_FILE for c in comments])
+    expected = data.drop_duplicates(['language', 'line']).drop_duplicates(['language', 'location'])
+
+    unique = list(machine_learning.iter_unique_comments(COMMENTS_PER_FILE))
+    assert unique == expected.to_dict('records')
+
+
+class fake_binarizer:
+    @staticmethod
+    def inverse_transform(prediction):
+        return prediction
+
+
+class fake_model:
+    """Labels a comment security if it mentions a password or token, privacy otherwise"""
+
+    @staticmethod
+    def predict(data):
+        prediction = [('security',) if 'password' in line or 'token' in line else ('privacy', 'none')
+                      for line in data['new_line']]
+        return prediction, fake_binarizer
+
+
+@pytest.fixture
+def labeling(machine_learning, processor, tmp_path, monkeypatch):
+    stored = []
+
+    def create_processor(dictionary_file, workers, **options):
+        res = parallel_preprocessor(None, 1, **options)
+        res.correct_words = list(DICTIONARY)
+        return res
+
+    monkeypatch.setattr(machine_learning, "model", fake_model)
+    monkeypatch.setattr(machine_learning, "parallel_preprocessor", create_processor)
+    monkeypatch.setattr(machine_learning, "preprocess_cache_file", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(machine_learning, "label_batch_size", 2)
+    monkeypatch.setattr(machine_learning, "label_queued_batches", 1)
+    monkeypatch.setattr(machine_learning, "store_df", lambda data, name: stored.append(data))
+    return stored
+
+
+def test_label_comments_pipelined_matches_serial(machine_learning, labeling):
+    serial = machine_learning.label_comments(COMMENTS_PER_FILE, pipelined=False)
+    pipelined = machine_learning.label_comments(iter(COMMENTS_PER_FILE), pipelined=True)
+
+    assert pipelined['count'] == serial['count']
+    assert serial['count'] == "security: 3 privacy: 1 none: 1 "
+    serial_data, pipelined_data = labeling
+    pd.testing.assert_frame_equal(pipelined_data, serial_data)
+
+    expected = pd.DataFrame.from_records([c for comments in COMMENTS_PER_FILE for c in comments])
+    expected = expected.drop_duplicates(['language', 'line']).drop_duplicates(['language', 'location'])
+    assert serial_data[['line', 'location', 'language']].to_dict('records') == expected.to_dict('records')
+
+
+def test_label_comments_without_comments(machine_learning, labeling):
+    assert machine_learning.label_comments([[], []], pipelined=True)['count'] == ""
+    assert labeling[0].empty
@@ -0,0 +1,30 @@
+import os
+
+from project.machine_learning.src.csv_file_modifier.modifier import csv_modifier, file_index
+
+
+def test_file_index_lists_files_in_walk_order(tmp_path):
+    for name in ("b.py", "a.c", "sub/c.py", "sub/deeper/d.txt", "other/e.py"):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+
+    index = file_index(str(tmp_path))
+
+    walked = [os.path.join(root, file) for root, dirs, files in os.walk(str(tmp_path)) for file in files]
+    assert index.files == walked
+    assert index.search_file("*py") == [file for file in walked if file.endswith(".py")]
+    assert index.search_file("c.py") == [os.path.join(str(tmp_path), "sub", "c.py")]
+    assert index.search_file("missing.py") == []
+
+
+def test_find_next_filename_skips_existing_files(tmp_path):
+    (tmp_path / "commentfile0.csv").write_text("")
+    (tmp_path / "commentfile1.csv").write_text("")
+
+    assert csv_modifier().find_next_filename("commentfile", str(tmp_path)) == "commentfile2.csv"
+
+
+def test_check_file_is_same_format():
+    assert csv_modifier.check_file_is_same_format("a.testformat", "*.testformat")
+    assert not csv_modifier.check_file_is_same_format("a.testformat", "*.randomformat")
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from project.machine_learning.src import parallel_preprocessor as pp
+from project.tests.conftest import COMMENTS, DICTIONARY, random_comments
+
+
+def test_parallel_preprocessor_matches_process_comment(processor, monkeypatch):
+    # The workers are forked, they inherit the stopwords, tokeniser and dictionary of the test
+    monkeypatch.setattr(pp.preprocessor, "load_dictionary", lambda file: (list(DICTIONARY),) +
+                        pp.preprocessor.get_lexicon(DICTIONARY))
+    comments = COMMENTS + list(random_comments(200)) + COMMENTS
+    series = pd.Series(comments, index=range(len(comments), 0, -1))
+
+    with pp.parallel_preprocessor('dictionary', workers=3, chunk_size=40) as parallel:
+        res = parallel.process_series(series)
+        assert parallel.process_series(pd.Series([], dtype=object)).empty
+    assert parallel.pool is None
+
+    assert list(res.index) == list(series.index)
+    assert list(res) == [processor.process_comment(comment)[0] for comment in comments]
+
+
+def test_parallel_preprocessor_with_one_worker_runs_in_process(processor, monkeypatch):
+    monkeypatch.setattr(pp.preprocessor, "load_dictionary", lambda file: (list(DICTIONARY),) +
+                        pp.preprocessor.get_lexicon(DICTIONARY))
+    parallel = pp.parallel_preprocessor('dictionary', workers=1)
+    parallel.start()
+    assert parallel.pool is None
+    assert list(parallel.process_series(pd.Series(COMMENTS))) == [processor.process_comment(c)[0] for c in COMMENTS]
+
+
+def test_workers_per_task_share_the_cores(monkeypatch):
+    monkeypatch.setattr(pp, "get_available_cores", lambda: 8)
+
+    assert pp.get_workers_per_task(1) == 8
+    assert pp.get_workers_per_task(3) == 2
+    assert pp.get_workers_per_task(8) == 1
+    assert pp.get_workers_per_task(16) == 1
+    assert pp.get_workers_per_task(0) == 8
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from project.machine_learning.src import pipeline
+
+
+def test_iter_batches():
+    assert list(pipeline.iter_batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(pipeline.iter_batches([], 2)) == []
+
+
+@pytest.mark.parametrize("threaded", [True, False])
+def test_pipeline_keeps_order(threaded):
+    stages = [lambda x: x + 1, lambda x: x * 2]
+    assert list(pipeline.iter_pipeline(range(100), stages, 2, threaded)) == [(x + 1) * 2 for x in range(100)]
+
+
+def test_pipeline_overlaps_stages():
+    events = []
+    last_stage_started = threading.Event()
+    first_stage_finished = threading.Event()
+
+    def stage(number):
+        def run(x):
+            events.append(("start", number, x))
+            # The last stage holds the first item until the first stage is done with every item
+            if number == 1 and x == 9:
+                last_stage_started.wait(5)
+                first_stage_finished.set()
+            elif number == 3 and x == 0:
+                last_stage_started.set()
+                first_stage_finished.wait(5)
+            events.append(("end", number, x))
+            return x
+        return run
+
+    assert list(pipeline.iter_pipeline(range(10), [stage(1), stage(2), stage(3)])) == list(range(10))
+    assert events.index(("start", 3, 0)) < events.index(("end", 1, 9)) < events.index(("end", 3, 0))
+
+def test_pipeline_bounds_items_in_flight():
+    read = []
+
+    def items():
+        for i in range(100):
+            read.append(i)
+            yield i
+
+    results = pipeline.iter_pipeline(items(), [lambda x: x], max_queued=2)
+    next(results)
+    time.sleep(0.2)
+    # At most two items wait in each of the two queues, one in the stage and one being read
+    assert len(read) <= 7
+    results.close()
+
+
+def test_pipeline_raises_stage_exception_and_stops_reading():
+    closed = threading.Event()
+
+    def items():
+        try:
+            for i in range(1000):
+                yield i
+        finally:
+            closed.set()
+
+    def fail(x):
+        if x == 3:
+            raise ValueError("bad item")
+        return x
+
+    threads = threading.active_count()
+    with pytest.raises(ValueError, match="bad item"):
+        list(pipeline.iter_pipeline(items(), [fail]))
+    assert closed.is_set()
+    assert threading.active_count() == threads
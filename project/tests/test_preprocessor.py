@@ -0,0 +1,283 @@
+import json
+import os
+import random
+import re
+import string
+import time
+from collections import Counter
+
+import pandas as pd
+import pytest
+from nltk.stem import PorterStemmer
+
+from project.machine_learning.src import preprocessor
+from project.machine_learning.src.preprocessor import preprocess
+from project.machine_learning.src.comment_cache import comment_cache
+from project.tests.conftest import COMMENTS, DICTIONARY, WORD_FILE, random_comments
+
+
+def legacy_process_comment(processor, comment):
+    """process_comment as it was before the normaliser was compiled"""
+    res = ""
+    comment_length = len(re.findall(r'\w+', comment))
+    if comment_length <= 100:
+        symbols = ".()_-,\"':{}[]/\\+!?"
+        rep = dict((re.escape(k), " ") for k in symbols)
+        pattern = re.compile("|".join(rep.keys()))
+        line = pattern.sub(lambda m: rep[re.escape(m.group(0))], comment)
+        line = line.translate(dict((ord(char), None) for char in string.punctuation))
+        if comment_length <= 40:
+            line = processor.split_word(line, is_list=False)
+        line = processor.process_out_noise2(line)
+        for word in processor.tokenise(line):
+            word = word.lower()
+            if word not in preprocessor.sw.words('english'):
+                word = PorterStemmer().stem(word)
+                res = res + " " + word if res != "" else word
+    return res, []
+
+
+def test_process_comment_matches_legacy_output(processor):
+    for comment in COMMENTS + list(random_comments(300)):
+        assert processor.process_comment(comment) == legacy_process_comment(processor, comment), comment
+
+
+def test_replace_sym_with_space_is_a_single_translation(processor):
+    assert processor.replace_sym_with_space("a.b(c)_d-e,f'g:h{i}j[k]l/m\\n+o!p?q#r$s") == "a b c  d e f g h i j k l m n o p qrs"
+
+
+def test_stem_and_stopwords_are_cached(processor):
+    assert preprocess.is_stopword("the")
+    assert not preprocess.is_stopword("privacy")
+    assert preprocess.stem("running") == PorterStemmer().stem("running")
+    assert preprocessor.stem_word.cache_info().currsize > 0
+
+
+def has_nltk_data():
+    try:
+        preprocessor.sw.words('english')
+        preprocessor.nltk.word_tokenize("probe")
+    except LookupError:
+        return False
+    return True
+
+
+@pytest.mark.skipif(not has_nltk_data(), reason="NLTK stopwords and punkt data are not installed")
+def test_process_comment_matches_legacy_output_with_nltk_data():
+    processor = preprocess()
+    processor.correct_words = list(DICTIONARY)
+    for comment in COMMENTS + list(random_comments(100)):
+        assert processor.process_comment(comment) == legacy_process_comment(processor, comment), comment
+
+
+def legacy_split_word(processor, sentence):
+    vocabulary = ['coma', 'mark', 'runner', 'software', 'fixme', 'todo', 'coordinator', 'onboarding', 'announcing',
+                  'https', 'coord', 'beats', 'alives']
+    common = ['ability', 'lied', "ting", "able", "cant", "fish", "ed", "ing", "gated"]
+    res = []
+    for word in [x.strip() for x in sentence.lower().strip().split(' ')]:
+        processor.aux_split_word(word, processor.correct_words + vocabulary, common, res)
+    return "".join(" " + word for word in res)
+
+
+def random_compounds(words, count, seed=0):
+    rand = random.Random(seed)
+    for i in range(count):
+        yield " ".join("".join(rand.choice(words) for j in range(rand.randint(1, 3))) for k in range(rand.randint(1, 6)))
+
+
+def test_split_word_matches_legacy_output(processor):
+    for sentence in COMMENTS + list(random_compounds(DICTIONARY + ['ing', 'able', 'xq', 'todo'], 500)):
+        assert processor.split_word(sentence, is_list=False) == legacy_split_word(processor, sentence), sentence
+
+
+@pytest.mark.skipif(not os.path.isfile(WORD_FILE), reason="word.pkl is not available")
+def test_split_word_matches_legacy_output_with_word_file():
+    processor = preprocess(dictionary_file=WORD_FILE)
+    assert preprocess(dictionary_file=WORD_FILE).lexicon is processor.lexicon
+    for sentence in ["userpassword privacycheck", "onboardingcoordinator readbuffer", "Thisisnotaword at all"]:
+        assert processor.split_word(sentence, is_list=False) == legacy_split_word(processor, sentence), sentence
+
+
+def test_lexicon_follows_replaced_word_list(processor):
+    assert processor.split_word("privacytoken", is_list=False) == " privacy token"
+    processor.correct_words = ['privacytoken']
+    assert processor.split_word("privacytoken", is_list=False) == " privacytoken"
+
+
+def test_split_points_skip_sides_too_long_to_be_words():
+    for length in range(0, 60):
+        for longest in range(1, 30):
+            expected = [i for i in range(3, length - 1) if i <= longest or length - i <= longest]
+            assert list(preprocessor.get_split_points(length, longest)) == expected
+
+
+def test_segment_word_splits_at_first_point_made_of_words():
+    lexicon = frozenset(['user', 'pass', 'word', 'password', 'users'])
+    common = preprocessor.SPLIT_COMMON_WORDS
+
+    assert preprocessor.segment_word('userpassword', lexicon, common, {}) == (('user', 'password'), True)
+    assert preprocessor.segment_word('xqzpassword', lexicon, common, {}) == (('xqzpassword',), False)
+    assert preprocessor.segment_word('pass', lexicon, common, {}) == (('pass',), True)
+    # aux_split_word keeps the parts of its failed attempt at xqzuser | pass
+    res = []
+    assert preprocess().aux_split_word('xqzuserpass', lexicon, common, res) is False
+    assert preprocessor.segment_word_compatible('xqzuserpass', lexicon, common, {}) == (tuple(res), False)
+    assert res == ['xqz', 'user', 'pass']
+    assert preprocessor.segment_word('xqzuserpass', lexicon, common, {}) == (('xqzuserpass',), False)
+
+
+@pytest.mark.parametrize("compatible_split", [True, False])
+def test_split_word_segments_every_substring_once(processor, compatible_split, monkeypatch):
+    processor.compatible_split = compatible_split
+    identifier = "userdatavaluefilename" * 4
+    name = "segment_word_compatible" if compatible_split else "segment_word"
+    segment = getattr(preprocessor, name)
+    calls = []
+    segmented = []
+
+    def counting_segment(word, lexicon, common_words, memo, longest=None):
+        calls.append(word)
+        if word not in memo:
+            segmented.append(word)
+        return segment(word, lexicon, common_words, memo, longest)
+
+    monkeypatch.setattr(preprocessor, name, counting_segment)
+    processor.split_word(identifier + " " + identifier * 3, is_list=False)
+
+    assert len(segmented) == len(set(segmented))
+    # Each segmentation tries fewer split points than its word has letters, two calls each at most
+    assert len(calls) <= 2 * len(identifier) * len(segmented) + 2
+
+def test_correct_spelling_of_correct_words_uses_index(processor):
+    assert processor.correct_spelling("pasword", processor.correct_words) == ("password", True)
+    assert processor.get_spelling_corrector() is processor.get_spelling_corrector()
+    # Another vocabulary is scanned
+    assert processor.correct_spelling("pasword", ["sword", "passwords"]) == ("passwords", True)
+
+    processor.correct_words = ['passed']
+    assert processor.correct_spelling("pasword", processor.correct_words) == ("pasword", False)
+
+
+def test_split_word_corrects_spelling_when_enabled(processor):
+    assert processor.split_word("privcy pasword userdata", is_list=False) == " privcy pasword user data"
+    processor.spelling_correction = True
+    assert processor.split_word("privcy pasword userdata", is_list=False) == " privacy password user data"
+
+
+def test_process_series_matches_process_comment(processor):
+    comments = COMMENTS + list(random_comments(300)) + ["123 4567 " * 3, "42", "averyveryverylongidentifierindeed ok"]
+    comments = comments + comments[:50]
+    series = pd.Series(comments, index=range(1000, 1000 + 2 * len(comments), 2))
+
+    res = processor.process_series(series)
+
+    assert list(res.index) == list(series.index)
+    assert list(res) == [processor.process_comment(comment)[0] for comment in comments]
+    assert processor.process_series(pd.Series([], dtype=object)).empty
+
+
+def test_processed_comments_are_cached(processor, tmp_path, monkeypatch):
+    cache = comment_cache(str(tmp_path / "cache.db"), tablename="preprocessed_comments")
+    processor.cache = cache
+    comments = COMMENTS + list(random_comments(50))
+    expected = [legacy_process_comment(processor, comment)[0] for comment in comments]
+
+    assert list(processor.process_series(pd.Series(comments + comments))) == expected + expected
+    assert cache.hits == 0
+
+    processed = []
+    process_comment_list = processor.process_comment_list
+    monkeypatch.setattr(processor, "process_comment_list", lambda comments: processed.extend(comments) or
+                        process_comment_list(comments))
+    assert list(processor.process_series(pd.Series(comments + ["new comment"]))) == expected + ["new comment"]
+    assert processed == ["new comment"]
+    assert processor.process_comment(comments[0]) == (expected[0], [])
+    assert cache.hits == len(set(comments)) + 1
+    assert cache.hit_rate() == cache.hits / (cache.hits + cache.misses)
+
+    # Another preprocessing of the comments is not read from the cache
+    monkeypatch.setattr(preprocessor, "PREPROCESS_VERSION", preprocessor.PREPROCESS_VERSION + 1)
+    processed.clear()
+    processor.process_series(pd.Series(comments[:3]))
+    assert processed == comments[:3]
+    cache.close()
+
+
+def test_cache_is_committed_before_comments_are_processed(processor, tmp_path, monkeypatch):
+    database = str(tmp_path / "cache.db")
+    processor.cache = comment_cache(database, tablename="preprocessed_comments", timeout=0.1)
+    processor.process_series(pd.Series(COMMENTS[:2]))
+    start = time.time()
+
+    # Another job reads and writes the cache while the misses of this one are processed
+    other = comment_cache(database, tablename="preprocessed_comments", timeout=0.1)
+    process_comment_list = processor.process_comment_list
+    def process_while_writing(comments):
+        last_used = other.cur.execute("select min(last_used) from preprocessed_comments").fetchone()[0]
+        assert last_used >= start
+        other.put("other", ["written"])
+        other.commit()
+        return process_comment_list(comments)
+
+    monkeypatch.setattr(processor, "process_comment_list", process_while_writing)
+    processor.process_series(pd.Series(COMMENTS[:3]))
+    assert processor.cache.get("other") == ["written"]
+    other.close()
+    processor.cache.close()
+
+def test_word_counts_stream_through_csv_files(processor, tmp_path):
+    comments = COMMENTS + list(random_comments(100)) + COMMENTS[:3]
+    pd.DataFrame({'line': comments, 'language': 'python'}).to_csv(tmp_path / "comments.csv", index=False)
+    expected = Counter(word for comment in comments for word in legacy_process_comment(processor, comment)[0].split())
+
+    counts = processor.count_words(str(tmp_path / "comments.csv"), chunk_size=7)
+    assert counts == expected
+
+    # Counts of several files or processes add up
+    assert processor.count_words(str(tmp_path / "comments.csv"), Counter(counts)) == expected + expected
+    preprocessor.write_frequency_dictionary(counts, str(tmp_path / "a.json"))
+    preprocessor.write_frequency_dictionary(Counter({'extra': 2}), str(tmp_path / "b.json"))
+    merged = preprocessor.merge_frequency_dictionaries([str(tmp_path / "a.json"), str(tmp_path / "b.json")])
+    assert merged == expected + Counter({'extra': 2})
+
+
+def test_create_dist_file_writes_json(processor, tmp_path):
+    pd.DataFrame({'line': ["user data", "user privacy"]}).to_csv(tmp_path / "comments.csv", index=False)
+    processor.open_csv_file(str(tmp_path / "comments.csv"))
+
+    filename = processor.create_dist_file(savedir=str(tmp_path))
+
+    with open(filename, encoding="utf-8") as f:
+        assert json.load(f) == {'user': 2, 'data': 1, 'privaci': 1}
+
+
+TOKENISER_LINES = ["user data", "cannot wanna gonna", "wannabe Cannot gotta lemme gimme", "«quoted» “hi” ‘x’",
+                   "a—b c–d", "über naïve 日本語 €5 emoji😀", "tab\tsep end", "", "   ", "wanna"]
+
+
+def test_regex_tokeniser_matches_treebank_tokeniser():
+    # Without the Punkt data, the tokeniser word_tokenize runs on every sentence
+    for line in TOKENISER_LINES + [processor_line for processor_line in random_comments(300)]:
+        line = line.translate(preprocessor.SYMBOL_TABLE)
+        assert preprocessor.regex_tokenise(line) == preprocessor.nltk.word_tokenize(line, preserve_line=True), line
+
+
+def test_tokeniser_is_selectable(processor):
+    processor.tokeniser = 'regex'
+    assert processor.tokenise("cannot store") == ["can", "not", "store"]
+    assert processor.get_cache_key("comment") != preprocess().get_cache_key("comment")
+    with pytest.raises(ValueError):
+        preprocess(tokeniser='split')
+
+
+def test_compare_tokenisers_reports_differences(processor, monkeypatch):
+    monkeypatch.setattr(preprocessor.nltk, "word_tokenize", lambda sentence: sentence.split())
+    report = processor.compare_tokenisers(["cannot store the data", "user data", "user data", "a—b"], max_examples=1)
+
+    assert report['lines'] == 3
+    assert report['different'] == 2
+    assert report['processed_different'] == 2
+    assert report['different_share'] == 2 / 3
+    assert report['examples'] == [{'line': ' cannot store the data', 'nltk': ['cannot', 'store', 'the', 'data'],
+                                   'regex': ['can', 'not', 'store', 'the', 'data']}]
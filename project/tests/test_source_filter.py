@@ -0,0 +1,87 @@
+import zipfile
+
+import pytest
+
+from project.machine_learning.src import extractor
+from project.machine_learning.src.source_filter import source_filter
+
+
+def write(root, name, content):
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(content, bytes):
+        path.write_bytes(content)
+    else:
+        path.write_text(content)
+    return str(path)
+
+
+def test_source_filter_skips_and_counts(tmp_path):
+    write(tmp_path, ".gitignore", "build/\n*.log.py\n!keep.log.py\n")
+    write(tmp_path, ".gitattributes", "docs/** linguist-generated\nextern/* linguist-vendored=true\n")
+    files = {
+        'kept': write(tmp_path, "src/main.py", "# a comment\n"),
+        'negated': write(tmp_path, "keep.log.py", "# kept\n"),
+        'vendored': write(tmp_path, "node_modules/lib/index.js", "// vendored\n"),
+        'generated': write(tmp_path, "static/app.min.js", "// minified name\n"),
+        'gitignore': write(tmp_path, "build/out.py", "# built\n"),
+        'ignored': write(tmp_path, "debug.log.py", "# ignored\n"),
+        'attribute_generated': write(tmp_path, "docs/api/page.html", "<!-- generated -->\n"),
+        'attribute_vendored': write(tmp_path, "extern/lib.c", "/* vendored */\n"),
+        'size': write(tmp_path, "big.py", "# big\n" * 300),
+        'binary': write(tmp_path, "blob.c", b"/* text */\0\1\2"),
+        'minified': write(tmp_path, "long.js", "var a=1;" * 130 + "\n"),
+    }
+
+    file_filter = source_filter(max_file_size=1500, max_line_length=1000)
+    kept = [name for name, path in files.items() if file_filter.is_extractable(str(tmp_path), path)]
+
+    assert kept == ['kept', 'negated']
+    assert file_filter.skipped_files == {'vendored': 2, 'generated': 2, 'gitignore': 2,
+                                         'size': 1, 'binary': 1, 'minified': 1}
+    assert file_filter.skipped_bytes['size'] == 1800
+
+
+def test_snapshot_extraction_uses_filter(tmp_path):
+    write(tmp_path, "main.py", "# kept comment\n")
+    write(tmp_path, "vendor/dep.py", "# vendored comment\n")
+
+    file_filter = source_filter()
+    comments = extractor.iter_comment_from_snapshot(str(tmp_path), extractor.extract_all_comment_from_file,
+                                                    file_filter=file_filter)
+
+    assert [comment['line'] for batch in comments for comment in batch] == ["kept comment "]
+    assert file_filter.summary()['skipped_files'] == {'vendored': 1}
+
+
+@pytest.mark.parametrize("bare", [False, True])
+def test_gitignore_does_not_apply_to_tracked_files(init_git_repo, tmp_path, bare):
+    write(tmp_path, ".gitignore", "*_gen.py\n")
+    write(tmp_path, "main.py", "# main comment\n")
+    write(tmp_path, "schema_gen.py", "# committed anyway\n")
+    git_repo = init_git_repo(tmp_path)
+    git_repo.git.add("--force", A=True)
+    git_repo.index.commit("fixture")
+
+    local = source_filter()
+    list(extractor.iter_comment_from_local(str(tmp_path), file_filter=local))
+    assert local.skipped_files == {'gitignore': 1}
+
+    clone = source_filter()
+    comments = extractor.iter_comment_from_repo("file://" + str(tmp_path), "main", file_filter=clone, bare=bare)
+    assert sorted(comment['line'] for batch in comments for comment in batch) == ["committed anyway ", "main comment "]
+    assert clone.skipped_files == {}
+
+
+def test_archive_members_get_no_rules(tmp_path):
+    archive = tmp_path / "src.zip"
+    with zipfile.ZipFile(str(archive), "w") as zip_archive:
+        zip_archive.writestr(".gitignore", "*.py\n")
+        zip_archive.writestr(".gitattributes", "*.py linguist-generated\n")
+        zip_archive.writestr("main.py", "# archived comment\n")
+        zip_archive.writestr("vendor/dep.py", "# vendored comment\n")
+
+    file_filter = source_filter()
+    comments = extractor.iter_comment_from_archive(str(archive), file_filter=file_filter)
+    assert [comment['line'] for batch in comments for comment in batch] == ["archived comment "]
+    assert file_filter.skipped_files == {'vendored': 1}
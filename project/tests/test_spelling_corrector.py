@@ -0,0 +1,98 @@
+import os
+import random
+import string
+
+import joblib
+import pytest
+from nltk.metrics.distance import edit_distance
+
+from project.machine_learning.src.spelling_corrector import spelling_corrector, WORD_END
+from project.tests.conftest import WORD_FILE
+
+
+VOCABULARY = ['user', 'users', 'used', 'data', 'date', 'check', 'cheek', 'value', 'valve', 'file', 'fill', 'files',
+              'name', 'names', 'read', 'reader', 'write', 'writer', 'buffer', 'privacy', 'primary', 'password',
+              'passport', 'token', 'taken', 'Token', 'user', 'a', 'ab']
+
+
+def legacy_correct_spelling(word, vocabulary, min_word_size=1):
+    """preprocess.correct_spelling scanning the vocabulary, without its IndexError on unknown first letters"""
+    if len(word) > min_word_size:
+        temp = [(edit_distance(word, w), w) for w in vocabulary if w[0] == word[0]]
+        sorted_temp = sorted(temp, key=lambda val: val[0])
+        if sorted_temp and sorted_temp[0][0] <= 2:
+            return sorted_temp[0][1], True
+    return word, False
+
+
+def misspell(words, count, seed=0):
+    rand = random.Random(seed)
+    for i in range(count):
+        word = list(rand.choice(words))
+        for j in range(rand.randint(0, 3)):
+            position = rand.randrange(1, len(word) + 1)
+            operation = rand.random()
+            if operation < 0.3 and len(word) > 1:
+                del word[min(position, len(word) - 1)]
+            elif operation < 0.6:
+                word.insert(position, rand.choice(string.ascii_lowercase))
+            elif operation < 0.8 and len(word) > 2:
+                position = min(position, len(word) - 2)
+                word[position], word[position + 1] = word[position + 1], word[position]
+            else:
+                word[min(position, len(word) - 1)] = rand.choice(string.ascii_lowercase)
+        yield "".join(word)
+
+
+def test_spelling_corrector_matches_scan():
+    corrector = spelling_corrector(VOCABULARY)
+    for word in list(misspell(VOCABULARY, 1000)) + ['', 'x', 'zzz', 'Tokn', 'usr', 'ab']:
+        for min_word_size in (0, 1, 5):
+            expected = legacy_correct_spelling(word, VOCABULARY, min_word_size)
+            assert corrector.correct(word, min_word_size) == expected, word
+
+
+def test_spelling_corrector_prefers_first_word_of_vocabulary():
+    assert spelling_corrector(['cat', 'car']).correct('cax') == ('cat', True)
+    assert spelling_corrector(['car', 'cat']).correct('cax') == ('car', True)
+    assert spelling_corrector(['car', 'cat']).find_nearest('cat') == (0, 'cat')
+    assert spelling_corrector(['car'], max_distance=0).correct('cax') == ('cax', False)
+
+
+def test_spelling_corrector_caches_corrections():
+    corrector = spelling_corrector(VOCABULARY)
+    corrector.correct('pasword')
+    corrector.correct('pasword')
+    assert corrector.find_nearest.cache_info().hits == 1
+
+
+class counting_node(dict):
+    """Trie node counting how many times the search expands a node"""
+    expanded = 0
+
+    def items(self):
+        counting_node.expanded += 1
+        return super().items()
+
+
+def to_counting_nodes(node, nodes):
+    nodes.append(node)
+    return counting_node((char, child if char == WORD_END else to_counting_nodes(child, nodes))
+                         for char, child in node.items())
+
+
+@pytest.mark.skipif(not os.path.isfile(WORD_FILE), reason="word.pkl is not available")
+def test_spelling_corrector_prunes_word_file_trie(monkeypatch):
+    words = joblib.load(WORD_FILE)
+    corrector = spelling_corrector(words)
+    nodes = []
+    corrector.root = to_counting_nodes(corrector.root, nodes)
+    queries = list(misspell(words, 50, seed=1))
+
+    monkeypatch.setattr(counting_node, "expanded", 0)
+    corrections = [corrector.correct(word) for word in queries]
+    # A search expands a few hundred nodes, where a scan compares every word starting with the same letter
+    assert counting_node.expanded / len(queries) < len(nodes) / 100
+
+    for word, correction in list(zip(queries, corrections))[:3]:
+        assert correction == legacy_correct_spelling(word, words), word
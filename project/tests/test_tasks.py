@@ -1,4 +1,102 @@
+import io
+import os
+import types
+import zlib
+
+import pytest
+
+
 def test_home(test_app):
     client = test_app.test_client()
     resp = client.get("/")
     assert resp.status_code == 200
+
+
+@pytest.fixture
+def ingest_root(machine_learning, tmp_path, monkeypatch):
+    root = tmp_path / "ingest"
+    (root / "repo" / "src").mkdir(parents=True)
+    (tmp_path / "outside").mkdir()
+    os.symlink(str(tmp_path / "outside"), str(root / "escape"))
+    monkeypatch.setattr(machine_learning, "ingest_root", str(root))
+    return root
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    from project.server.main import views
+    jobs = []
+
+    class fake_task:
+        @staticmethod
+        def delay(info):
+            jobs.append(info)
+            return types.SimpleNamespace(id="task-" + str(len(jobs)))
+
+    monkeypatch.setattr(views, "create_task", fake_task)
+    return jobs
+
+
+@pytest.mark.parametrize("path", ["../outside", "repo/../../outside", "/etc", "escape", "escape/..", "", None])
+def test_resolve_ingest_path_refuses_paths_outside_the_root(machine_learning, ingest_root, path):
+    assert machine_learning.resolve_ingest_path(path) is None
+
+
+def test_resolve_ingest_path_accepts_directories_under_the_root(machine_learning, ingest_root):
+    expected = os.path.realpath(str(ingest_root / "repo" / "src"))
+    assert machine_learning.resolve_ingest_path("repo/src") == expected
+    assert machine_learning.resolve_ingest_path(str(ingest_root / "repo" / "src")) == expected
+    assert machine_learning.resolve_ingest_path("repo/src/../src") == expected
+
+
+def test_resolve_ingest_path_refuses_everything_without_root(machine_learning, ingest_root, monkeypatch):
+    monkeypatch.setattr(machine_learning, "ingest_root", None)
+    assert machine_learning.resolve_ingest_path("repo") is None
+    assert machine_learning.resolve_ingest_path(str(ingest_root / "repo")) is None
+
+
+def test_path_job_outside_the_root_is_forbidden(test_app, ingest_root, queued):
+    client = test_app.test_client()
+    for path in ["../outside", "/etc", "escape"]:
+        resp = client.post("/tasks", data={'type': 'path', 'path': path})
+        assert resp.status_code == 403
+    assert queued == []
+
+    resp = client.post("/tasks", data={'type': 'path', 'path': 'repo'})
+    assert resp.status_code == 200
+    assert queued == [{'type': 'path', 'path': 'repo'}]
+
+
+def test_archive_job_without_file_is_a_bad_request(test_app, queued):
+    client = test_app.test_client()
+    assert client.post("/tasks", data={'type': 'archive'}).status_code == 400
+    resp = client.post("/tasks", data={'type': 'archive', 'file': (io.BytesIO(b""), "")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 400
+    assert queued == []
+
+
+def test_archive_is_stored_apart_from_the_flushed_database(test_app, machine_learning, queued, monkeypatch):
+    from project.server.main import views
+    stored = {}
+    monkeypatch.setattr(machine_learning.archive_store, "set",
+                        lambda key, value, ex=None: stored.update({key: (value, ex)}))
+    monkeypatch.setattr(views.r, "set", lambda *args, **kwargs: pytest.fail("archive stored in the flushed database"))
+
+    resp = test_app.test_client().post("/tasks", data={'type': 'archive', 'file': (io.BytesIO(b"archive bytes"), "src.zip")},
+                                       content_type="multipart/form-data")
+    assert resp.status_code == 200
+
+    [(key, (value, ttl))] = stored.items()
+    assert key.startswith("archive-")
+    assert zlib.decompress(value) == b"archive bytes"
+    assert ttl == machine_learning.archive_ttl
+    assert queued == [{'type': 'archive', 'file': key, 'filename': 'src.zip'}]
+
+    archive_db = machine_learning.archive_store.connection_pool.connection_kwargs.get('db', 0)
+    assert archive_db != views.r.connection_pool.connection_kwargs.get('db', 0)
+
+
+def test_archive_database_is_another_database_of_the_same_server(machine_learning):
+    assert machine_learning.with_database("redis://:secret@host:6379", 1) == "redis://:secret@host:6379/1"
+    assert machine_learning.with_database("redis://redis:6379/0", 1) == "redis://redis:6379/1"